@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Bench Pasta - Local micro-benchmarks for the upload hot paths
+
+No server needed: bodies are written into a local socket whose far end is
+drained by a thread, optionally throttled to simulate a network link. The
+multipart benchmark posts through requests to pasta_loadtest's in-process
+stand-in server, so the whole client path is measured.
+
+Usage:
+   ./bench_pasta.py pipeline                       # 256MB temp file, cold cache
+   ./bench_pasta.py pipeline --file big.iso        # Benchmark a real file
+   ./bench_pasta.py pipeline --net-rate 300        # Simulate a 300 MB/s link
+   ./bench_pasta.py pipeline --disk-rate 150 --net-rate 150   # Slow disk/NFS too
+   ./bench_pasta.py pipeline --buffers 8 --buffer-size 4
+   ./bench_pasta.py multipart                      # pasta_multipart vs requests_toolbelt over HTTP
+   ./bench_pasta.py multipart --chunk-size 10      # Also compare 10MB chunk requests
+"""
+
+import os
+import time
+import socket
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+
+try:
+    from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+except ImportError:
+    MultipartEncoder = None
+
+from pasta_loadtest import StandInServer
+from pasta_multipart import MultipartBody
+from pasta_pipeline import PrefetchReader, fadvise
+
+MB = 1024 * 1024
+
+class SocketSink:
+    """Socket pair whose read side is drained at an optional fixed rate"""
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.sender, self.receiver = socket.socketpair()
+        self.received = 0
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        while True:
+            data = self.receiver.recv(MB)
+            if not data:
+                return
+            self.received += len(data)
+            # Fixed cost per byte, no catching up after idle time (like a real link)
+            if self.rate:
+                time.sleep(len(data) / self.rate)
+
+    def close(self):
+        self.sender.shutdown(socket.SHUT_WR)
+        self.thread.join()
+        self.sender.close()
+        self.receiver.close()
+
+class ThrottledSource:
+    """FIFO fed from a file at a fixed rate, standing in for a slow disk or NFS mount"""
+
+    def __init__(self, path, rate):
+        self.dir = tempfile.mkdtemp(prefix="bench_pasta_fifo_")
+        self.path = os.path.join(self.dir, "source")
+        os.mkfifo(self.path)
+        self.thread = threading.Thread(target=self._feed, args=(path, rate), daemon=True)
+        self.thread.start()
+
+    def _feed(self, path, rate):
+        with open(path, 'rb') as src, open(self.path, 'wb') as fifo:
+            while True:
+                data = src.read(MB)
+                if not data:
+                    return
+                # Like the sink, an idle reader does not bank any speed
+                time.sleep(len(data) / rate)
+                fifo.write(data)
+
+    def close(self):
+        self.thread.join()
+        os.unlink(self.path)
+        os.rmdir(self.dir)
+
+def drop_cache(path):
+    """Evict the file from the page cache so every run reads from disk"""
+    with open(path, 'rb') as f:
+        fadvise(f.fileno(), "POSIX_FADV_DONTNEED")
+
+def send_sync(path, sock, block_size):
+    """The old single-stream upload loop: read a block, then send it, on one thread"""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                return
+            sock.sendall(data)
+
+def send_pipelined(path, sock, buffers, buffer_size):
+    """Read-ahead on one thread, send on another; reads to EOF, so the --disk-rate FIFO works too"""
+    with PrefetchReader(path, buffers, buffer_size) as reader:
+        for buf, length in reader:
+            sock.sendall(memoryview(buf)[:length])
+            reader.release(buf)
+
+def timed(label, path, size, args, run):
+    if args.cold:
+        drop_cache(path)
+    source = ThrottledSource(path, args.disk_rate * MB) if args.disk_rate else None
+    sink = SocketSink(args.net_rate * MB)
+    start = time.perf_counter()
+    run(source.path if source else path, sink.sender)
+    sink.close()
+    if source:
+        source.close()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:7.2f}s  {size / MB / elapsed:8.1f} MB/s")
+    return elapsed
+
+def bench_file(args):
+    """(path, temp path to delete or None) for --file or a fresh --size MB file"""
+    if args.file:
+        return Path(args.file), None
+    fd, temp_path = tempfile.mkstemp(prefix="bench_pasta_", dir=args.tmpdir)
+    with os.fdopen(fd, 'wb') as f:
+        for _ in range(args.size):
+            f.write(os.urandom(MB))
+    return Path(temp_path), temp_path
+
+def bench_pipeline(args):
+    path, temp_path = bench_file(args)
+    try:
+        size = path.stat().st_size
+        buffer_size = args.buffer_size * MB
+        print(f"File: {path} ({size / MB:.0f} MB), cache: {'cold' if args.cold else 'warm'}, "
+              f"disk: {f'{args.disk_rate} MB/s' if args.disk_rate else 'unthrottled'}, "
+              f"network: {f'{args.net_rate} MB/s' if args.net_rate else 'unthrottled'}")
+
+        results = {}
+        for _ in range(args.repeat):
+            results.setdefault("sync", []).append(timed(
+                "sync read+send (16MB)", path, size, args,
+                lambda source, sock: send_sync(source, sock, 16 * MB)))
+            results.setdefault("pipelined", []).append(timed(
+                f"pipelined {args.buffers}x{args.buffer_size}MB", path, size, args,
+                lambda source, sock: send_pipelined(source, sock, args.buffers, buffer_size)))
+
+        best_sync, best_pipelined = min(results["sync"]), min(results["pipelined"])
+        print(f"Speedup (best of {args.repeat}): {best_sync / best_pipelined:.2f}x")
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
+
+def post_toolbelt(url, path, offset, length):
+    """The old hot path: MultipartEncoder + monitor, over a file or a chunk read into bytes"""
+    sent = 0
+
+    def callback(monitor):
+        nonlocal sent
+        sent = monitor.bytes_read
+
+    with open(path, 'rb') as f:
+        if length is None:
+            body = f
+        else:
+            f.seek(offset)
+            body = f.read(length)
+        encoder = MultipartEncoder(fields={'file': ("bench.bin", body, 'application/octet-stream')})
+        monitor = MultipartEncoderMonitor(encoder, callback)
+        return requests.post(url, data=monitor, headers={'Content-Type': monitor.content_type})
+
+def post_multipart(url, path, offset, length):
+    sent = 0
+
+    def callback(nbytes):
+        nonlocal sent
+        sent += nbytes
+
+    with MultipartBody(path, "bench.bin", offset=offset, length=length) as body:
+        body.callback = callback
+        return requests.post(url, data=body, headers={'Content-Type': body.content_type})
+
+def timed_posts(label, url, path, size, chunk_size, post):
+    """Upload the file as one request, or as chunk_size requests in turn; returns (seconds, cpu seconds)"""
+    start, cpu = time.perf_counter(), time.process_time()
+    ranges = [(0, None)] if not chunk_size else [(offset, min(chunk_size, size - offset))
+                                                 for offset in range(0, size, chunk_size)]
+    for offset, length in ranges:
+        response = post(url, path, offset, length)
+        response.raise_for_status()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    print(f"  {label:<34} {elapsed:7.2f}s  {size / MB / elapsed:8.1f} MB/s  {cpu:6.2f}s CPU")
+    return elapsed, cpu
+
+def bench_multipart(args):
+    if MultipartEncoder is None:
+        print("requests-toolbelt is not installed, only pasta_multipart is measured")
+    path, temp_path = bench_file(args)
+    server = StandInServer(latency=0, capacity=1, ms_per_mb=0)
+    url = server.start() + "/api/upload"
+    try:
+        size = path.stat().st_size
+        print(f"File: {path} ({size / MB:.0f} MB), warm cache, local HTTP server "
+              f"(CPU includes the server thread, the same for both)")
+        variants = [("pasta_multipart", post_multipart)]
+        if MultipartEncoder is not None:
+            variants.insert(0, ("requests_toolbelt", post_toolbelt))
+        modes = [("single", 0)] + ([(f"{args.chunk_size}MB chunks", args.chunk_size * MB)] if args.chunk_size else [])
+
+        for mode, chunk_size in modes:
+            results = {}
+            for _ in range(args.repeat):
+                for name, post in variants:
+                    results.setdefault(name, []).append(
+                        timed_posts(f"{name} ({mode})", url, path, size, chunk_size, post))
+            if len(results) == 2:
+                old, new = min(results["requests_toolbelt"]), min(results["pasta_multipart"])
+                print(f"{mode}: {old[0] / new[0]:.2f}x faster, {old[1] / new[1]:.2f}x less CPU (best of {args.repeat})")
+    finally:
+        server.stop()
+        if temp_path:
+            os.unlink(temp_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pasta upload hot paths locally')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    pipeline = subparsers.add_parser('pipeline', help='Synchronous vs. pipelined single-stream reading')
+    pipeline.add_argument('--file', help='Benchmark this file instead of a temporary one')
+    pipeline.add_argument('--size', type=int, default=256, help='Temporary file size in MB (default: 256)')
+    pipeline.add_argument('--tmpdir', help='Where to create the temporary file (put it on the disk under test)')
+    pipeline.add_argument('--disk-rate', type=int, default=0,
+                          help='Simulated storage speed in MB/s, read through a FIFO (default: the real disk)')
+    pipeline.add_argument('--net-rate', type=int, default=0, help='Simulated link speed in MB/s (default: unthrottled)')
+    pipeline.add_argument('--buffers', type=int, default=4, help='Read-ahead buffers (default: 4)')
+    pipeline.add_argument('--buffer-size', type=int, default=8, help='Buffer size in MB (default: 8)')
+    pipeline.add_argument('--warm', dest='cold', action='store_false', help='Keep the file in the page cache')
+    pipeline.add_argument('--repeat', type=int, default=3, help='Runs per variant (default: 3)')
+
+    multipart = subparsers.add_parser('multipart', help='pasta_multipart vs. requests_toolbelt request bodies')
+    multipart.add_argument('--file', help='Benchmark this file instead of a temporary one')
+    multipart.add_argument('--size', type=int, default=256, help='Temporary file size in MB (default: 256)')
+    multipart.add_argument('--tmpdir', help='Where to create the temporary file')
+    multipart.add_argument('--chunk-size', type=int, default=10, metavar='MB',
+                           help='Also upload the file as chunks of this size like pasta_fast, 0 to skip (default: 10)')
+    multipart.add_argument('--repeat', type=int, default=3, help='Runs per variant (default: 3)')
+
+    args = parser.parse_args()
+    if args.bench == 'pipeline':
+        bench_pipeline(args)
+    elif args.bench == 'multipart':
+        bench_multipart(args)
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,27 @@ Pasta - File uploader with Rich progress bar
 
 Installation:
 1. Try system packages first (cleanest):
-   sudo pacman -S python-rich python-requests python-requests-toolbelt python-dotenv
+   sudo pacman -S python-rich python-requests python-dotenv
 
 2. If system packages aren't available, use pip with --break-system-packages:
-   pip install --break-system-packages rich requests requests-toolbelt python-dotenv
+   pip install --break-system-packages rich requests python-dotenv
 
 Usage:
-   ./pasta file.txt        # Upload file
-   ./pasta file.txt 10     # Upload file with 10 view limit
-   ./pasta -s file.txt     # Silent mode - output only the URL
+   ./pasta file.txt         # Upload file
+   ./pasta file.txt 10      # Upload file with 10 view limit
+   ./pasta -s file.txt      # Silent mode - output only the URL
+   ./pasta -m 2 file.txt    # Mirror to 2 hosts of the config pool
+   ./pasta -e file.txt      # Encrypt client-side, key in the URL fragment (see pasta_crypt.py)
+   ./pasta -O *.png         # Shrink screenshots first, then upload each (see pasta_image.py)
+   ./pasta history          # List/search/delete past uploads (see pasta_history.py)
+   ./pasta loadtest         # Ramp synthetic load against the server (see pasta_loadtest.py)
+   ./pasta --cprofile f.iso # Write a CPU/memory profile report of the run (see pasta_profile.py)
 """
 
 import os
 import sys
 import json
+import shutil
 import requests
 import argparse
 from pathlib import Path
@@ -33,56 +40,41 @@ except ImportError:
     print("  pip install --break-system-packages rich")
     sys.exit(1)
 
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    print("Error: python-dotenv not found. Please install with:")
-    print("  sudo pacman -S python-dotenv  # OR") 
-    print("  pip install --break-system-packages python-dotenv")
-    sys.exit(1)
-
-try:
-    from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
-except ImportError:
-    print("Error: requests-toolbelt not found. Please install with:")
-    print("  sudo pacman -S python-requests-toolbelt  # OR")
-    print("  pip install --break-system-packages requests-toolbelt")
-    sys.exit(1)
+from pasta_config import add_config_arguments, config_from_args, load_config
+from pasta_crypt import StreamCipher
+from pasta_hosts import HostPool, MirrorShortfallError, NoHealthyHostError
+from pasta_history import hash_file, record_upload, main as history_main
+from pasta_image import add_image_arguments, optimize_batch
+from pasta_multipart import MultipartBody
+from pasta_profile import add_profile_arguments, profiling
 
-def load_config():
-    """Load configuration from .env file"""
-    env_path = Path("/etc/pastit/.env")
-    if not env_path.exists():
-        print(".env file not found! Edit /etc/pastit/.env.example and rename it to /etc/pastit/.env to configure.")
-        sys.exit(1)
-    
-    load_dotenv(env_path)
-    
-    host = os.getenv("host")
-    auth_token = os.getenv("authorization_token")
-    
-    if not host or not auth_token:
-        print("Error: host or authorization_token not found in .env file")
-        sys.exit(1)
-    
-    return host, auth_token
+def upload_file(file_path, max_views=0, interactive=True, config=None, mirror=1, encrypt=False,
+                upload_path=None):
+    """Upload file with progress bar, optionally mirrored to several hosts.
 
-def upload_file(file_path, max_views=0, interactive=True):
-    """Upload file with progress bar"""
-    host, auth_token = load_config()
-    url = f"{host}/api/upload"
+    `upload_path` is a stand-in to send instead (e.g. an optimized image);
+    `file_path` is still what's shown and recorded in the history.
+    """
+    config = config or load_config()
+    # One key for every mirror and retry, so each copy decrypts with the same URL fragment
+    cipher = StreamCipher.generate() if encrypt or config.encrypt else None
+    pool = HostPool.from_config(config)
     
     file_path = Path(file_path)
     if not file_path.exists():
         print(f"Error: File '{file_path}' not found")
         sys.exit(1)
+    if not file_path.is_file():
+        print(f"Error: '{file_path}' is not a regular file; stream pipes with pasta_fast.py -")
+        sys.exit(1)
     
-    file_size = file_path.stat().st_size
+    send_path = Path(upload_path or file_path)
+    file_size = send_path.stat().st_size
+    # The server never learns the real name of an encrypted file either
+    upload_name = "encrypted.bin" if cipher else send_path.name
     
-    # Headers
+    # Headers (the per-host auth headers are added by each send)
     headers = {
-        "Authorization": auth_token,
-        "x-zipline-format": "gfycat",
         "x-zipline-original-name": "true",
     }
     
@@ -90,6 +82,61 @@ def upload_file(file_path, max_views=0, interactive=True):
         headers["x-zipline-max-views"] = str(max_views)
     
     console = Console()
+    progress = None
+    
+    def send(node_config):
+        """Upload to one host; called again on failover so it reopens the file"""
+        node_headers = {**node_config.upload_headers(), **headers}
+        sent = 0
+        
+        def upload_callback(nbytes):
+            nonlocal sent
+            sent += nbytes
+            # Silent mode for automation has no progress bar
+            if progress is not None:
+                progress.update(task, advance=nbytes)
+        
+        def rewind():
+            # A failed attempt is replayed from byte 0 elsewhere, so take its bytes back off the bar
+            if progress is not None and sent:
+                progress.update(task, advance=-sent)
+        
+        # Streamed in both modes so stalls are caught mid-body
+        with MultipartBody(send_path, upload_name, buffers=config.read_buffers,
+                           buffer_size=config.read_buffer_size, rate_limit=config.rate_limit,
+                           cipher=cipher) as body:
+            body.callback = upload_callback
+            body.stall = pool.policy.stall_monitor()
+            
+            try:
+                response = requests.post(
+                    node_config.upload_url,
+                    data=body,
+                    headers={**node_headers, 'Content-Type': body.content_type},
+                    timeout=pool.policy.timeout
+                )
+            except Exception:
+                rewind()
+                raise
+            if response.status_code != 200:
+                rewind()
+            return response
+    
+    shortfall = None
+    
+    def run_uploads():
+        nonlocal shortfall
+        try:
+            if mirror > 1:
+                return pool.mirror(send, mirror)
+            return [pool.upload(send)]
+        except MirrorShortfallError as e:
+            # The copies that made it are still printed and recorded before failing
+            shortfall = e
+            return e.results
+        except NoHealthyHostError as e:
+            print(f"Error: Upload failed on every host: {e}")
+            sys.exit(1)
     
     if interactive:
         # Show file info
@@ -108,6 +155,10 @@ def upload_file(file_path, max_views=0, interactive=True):
             size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
         
         console.print(f"📦 [bold cyan]File size:[/bold cyan] {size_str}")
+        if mirror > 1:
+            console.print(f"🪞 [bold magenta]Mirrors:[/bold magenta] {min(mirror, len(pool.nodes))} hosts")
+        if cipher:
+            console.print("🔐 [bold magenta]Encrypted[/bold magenta] (AES-256-GCM, key stays in the URL)")
         console.print()
         
         # Create progress bar
@@ -126,66 +177,106 @@ def upload_file(file_path, max_views=0, interactive=True):
         )
         
         with progress:
-            task = progress.add_task("upload", total=file_size)
-            
-            def upload_callback(monitor):
-                progress.update(task, advance=monitor.bytes_read - progress.tasks[task].completed)
-            
-            with open(file_path, 'rb') as f:
-                encoder = MultipartEncoder(
-                    fields={'file': (file_path.name, f, 'application/octet-stream')}
-                )
-                monitor = MultipartEncoderMonitor(encoder, upload_callback)
-                
-                response = requests.post(
-                    url,
-                    data=monitor,
-                    headers={**headers, 'Content-Type': monitor.content_type}
-                )
+            # Mirrors stream in parallel, so the bar covers every copy
+            task = progress.add_task("upload", total=file_size * min(mirror, len(pool.nodes)))
+            responses = run_uploads()
         
         console.print()
         console.print("✅ [bold green]Upload complete![/bold green]")
         
     else:
-        # Silent mode for automation
-        with open(file_path, 'rb') as f:
-            files = {'file': (file_path.name, f, 'application/octet-stream')}
-            response = requests.post(url, files=files, headers=headers)
-    
-    if response.status_code != 200:
-        print(response.text)
-        print(f"Error: Upload failed with status {response.status_code}")
-        sys.exit(1)
+        responses = run_uploads()
+    
+    for _, response in responses:
+        if response.status_code != 200:
+            print(response.text)
+            print(f"Error: Upload failed with status {response.status_code}")
+            sys.exit(1)
     
     try:
-        result = response.json()
-        file_url = result['files'][0]['url']
+        uploaded = [(node, response.json()['files'][0]) for node, response in responses]
+        file_urls = [file_info['url'] for _, file_info in uploaded]
+        if cipher:
+            file_urls = [cipher.url_with_key(url) for url in file_urls]
         
-        if interactive:
-            console.print(f"🔗 [bold yellow]URL:[/bold yellow] {file_url}")
-        else:
-            print(file_url)
+        for file_url in file_urls:
+            if interactive:
+                console.print(f"🔗 [bold yellow]URL:[/bold yellow] {file_url}")
+            else:
+                print(file_url)
+        
+        if cipher and interactive:
+            console.print(f"🔓 [bold blue]Download with:[/bold blue] pasta_crypt.py get '{file_urls[0]}' -o {file_path.name}")
             
     except (KeyError, IndexError, json.JSONDecodeError) as e:
         print(f"Error: Invalid response format: {e}")
         sys.exit(1)
+    
+    # After the URLs are out, so hashing for the history never delays them
+    sha256 = hash_file(send_path) if config.keep_history else None
+    for (node, file_info), file_url in zip(uploaded, file_urls):
+        record_upload("pasta", node.config.host, {**file_info, 'url': file_url}, path=file_path, size=file_size,
+                      sha256=sha256, max_views=max_views, config=config)
+    
+    if shortfall:
+        print(f"Error: Mirroring incomplete, {shortfall}", file=sys.stderr)
+        sys.exit(1)
+    
+    return file_urls
 
 def main():
+    # `pasta history ...` manages the local upload index instead of uploading
+    if len(sys.argv) > 1 and sys.argv[1] == 'history':
+        history_main(sys.argv[2:])
+        return
+    # `pasta loadtest ...` benchmarks the server instead of uploading
+    if len(sys.argv) > 1 and sys.argv[1] == 'loadtest':
+        from pasta_loadtest import main as loadtest_main
+        loadtest_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(description='Upload files to Zipline server')
-    parser.add_argument('file', help='File to upload')
+    parser.add_argument('files', nargs='+', metavar='file', help='File(s) to upload')
     parser.add_argument('max_views', nargs='?', type=int, default=0, help='Maximum number of views (optional)')
     parser.add_argument('-s', '--silent', action='store_true', help='Silent mode - output only the URL')
+    parser.add_argument('-m', '--mirror', type=int, default=1, metavar='N',
+                        help='Upload to N hosts of the config pool in parallel and print every URL')
+    parser.add_argument('-e', '--encrypt', action='store_true',
+                        help='Encrypt before uploading; the key is added to the URL as #fragment')
+    add_image_arguments(parser)
+    add_config_arguments(parser)
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
-    if not args.file:
+    # `pasta file.txt 10`: the greedy file list swallows the view limit
+    if len(args.files) > 1 and args.files[-1].isdigit() and not os.path.exists(args.files[-1]):
+        args.max_views = int(args.files.pop())
+    
+    if not args.files:
         print("No target file selected")
         sys.exit(1)
     
     # Determine if interactive mode
     interactive = not args.silent and sys.stdout.isatty()
+    config = config_from_args(args)
     
-    upload_file(args.file, args.max_views, interactive)
+    with profiling(args, "pasta"):
+        optimized, work_dir = {}, None
+        if args.optimize_images or config.optimize_images:
+            optimized, work_dir = optimize_batch(args.files, args.image_format, args.image_quality)
+            if interactive:
+                for path, (_, old_size, new_size) in optimized.items():
+                    Console().print(f"🖼️  [bold cyan]Optimized:[/bold cyan] {Path(path).name} "
+                                    f"{old_size / 1024:.0f} KB → {new_size / 1024:.0f} KB")
+        
+        try:
+            for file_path in args.files:
+                upload_path = optimized[file_path][0] if file_path in optimized else None
+                upload_file(file_path, args.max_views, interactive, config, args.mirror, args.encrypt, upload_path)
+        finally:
+            if work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Pasta Config - Shared configuration loader for the pasta uploaders
+
+Every script used to re-parse /etc/pastit/.env through python-dotenv and
+push the values into os.environ. This module parses the file once, validates
+it into per-profile settings and caches that compiled form, both in-process
+and on disk (keyed by the .env mtime/size), so repeat invocations skip the
+dotenv import and parse entirely.
+
+.env layout:
+   host=https://zipline.example.com      # default profile
+   authorization_token=...
+   chunk_size_mb=10                      # pasta_fast chunk size
+   max_workers=8                         # pasta_fast parallel connections
+   rate_limit_mb=0                       # upload cap in MB/s, 0 = unlimited
+   compression=0                         # zipline image compression %, 0 = off
+   connect_timeout=10                    # seconds, 0 = wait forever
+   read_timeout=300                      # seconds to wait for the server's reply
+   stall_rate_kb=16                      # abort an upload slower than this...
+   stall_seconds=30                      # ...for this long (0 = never)
+   max_retries=4                         # retries for retryable failures
+   read_buffers=4                        # read-ahead buffers for streamed uploads
+   read_buffer_mb=8                      # size of each read-ahead buffer
+   keep_history=1                        # record uploads in the local index (pasta history)
+   encrypt=0                             # encrypt uploads client-side (see pasta_crypt.py)
+   optimize_images=0                     # shrink PNGs before pasta uploads them (see pasta_image.py)
+   profile=default                       # profile used when none is given
+   pool=lan,backup                       # spread uploads over these profiles
+
+   # Extra profiles: <profile>__<key>, missing keys fall back to the default
+   lan__host=http://127.0.0.1:3000
+   lan__chunk_size_mb=64
+
+Overrides (highest wins): CLI (--config profile / --set key=value), then the
+environment (PASTIT_PROFILE, PASTIT_<KEY>), then the .env profile. They apply
+to the selected profile; pool members are read from their own profiles.
+
+Usage:
+   ./pasta_config.py                  # Show the resolved default profile
+   ./pasta_config.py --config lan     # Show another profile
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, asdict, replace
+from typing import Dict, List, Optional, Tuple
+
+ENV_PATH = Path(os.environ.get("PASTIT_ENV", "/etc/pastit/.env"))
+CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pastit" / "config.json"
+CACHE_VERSION = 8
+DEFAULT_PROFILE = "default"
+PROFILE_SEPARATOR = "__"
+PROFILE_ONLY_KEYS = ("pool", "profile")  # top-level keys that named profiles do not inherit
+
+# Tunables and their defaults; values are ints once compiled
+TUNING_DEFAULTS = {
+    "chunk_size_mb": 10,
+    "max_workers": 8,
+    "rate_limit_mb": 0,
+    "compression": 0,
+    "connect_timeout": 10,
+    "read_timeout": 300,
+    "stall_rate_kb": 16,
+    "stall_seconds": 30,
+    "max_retries": 4,
+    "read_buffers": 4,
+    "read_buffer_mb": 8,
+    "keep_history": 1,
+    "encrypt": 0,
+    "optimize_images": 0,
+}
+
+# Keys that --set and PASTIT_<KEY> may override
+OVERRIDE_KEYS = ("host", "authorization_token", "pool", *TUNING_DEFAULTS)
+
+class ConfigError(Exception):
+    """Raised when the .env file is missing or a profile is invalid"""
+
+@dataclass(frozen=True)
+class Config:
+    profile: str
+    host: str
+    authorization_token: str
+    chunk_size: int
+    max_workers: int
+    rate_limit: int
+    compression: int
+    pool: Tuple[str, ...] = ()
+    connect_timeout: int = TUNING_DEFAULTS["connect_timeout"]
+    read_timeout: int = TUNING_DEFAULTS["read_timeout"]
+    stall_rate: int = TUNING_DEFAULTS["stall_rate_kb"] * 1024
+    stall_seconds: int = TUNING_DEFAULTS["stall_seconds"]
+    max_retries: int = TUNING_DEFAULTS["max_retries"]
+    read_buffers: int = TUNING_DEFAULTS["read_buffers"]
+    read_buffer_size: int = TUNING_DEFAULTS["read_buffer_mb"] * 1024 * 1024
+    keep_history: bool = True
+    encrypt: bool = False
+    optimize_images: bool = False
+
+    @property
+    def upload_url(self) -> str:
+        return f"{self.host}/api/upload"
+
+    def api_url(self, path: str) -> str:
+        return f"{self.host}/api/{path.lstrip('/')}"
+
+    def upload_headers(self) -> Dict[str, str]:
+        """Base headers shared by every upload"""
+        headers = {
+            "Authorization": self.authorization_token,
+            "x-zipline-format": "gfycat",
+        }
+        if self.compression > 0:
+            headers["x-zipline-image-compression-percent"] = str(self.compression)
+        return headers
+
+def normalize_host(host: str) -> str:
+    """Strip trailing slashes and default to http:// for bare host:port"""
+    host = host.strip().rstrip("/")
+    if "://" not in host:
+        host = f"http://{host}"
+    return host
+
+def _parse_env_file(env_path: Path) -> Dict[str, str]:
+    # Imported lazily: with a warm cache dotenv is never loaded at all
+    try:
+        from dotenv import dotenv_values
+    except ImportError:
+        print("Error: python-dotenv not found. Please install with:")
+        print("  sudo pacman -S python-dotenv  # OR")
+        print("  pip install --break-system-packages python-dotenv")
+        sys.exit(1)
+
+    return {k: v for k, v in dotenv_values(env_path).items() if v is not None}
+
+def _to_int(profile: str, key: str, value) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{key} must be an integer in profile '{profile}', got {value!r}")
+    if number < 0:
+        raise ConfigError(f"{key} must not be negative in profile '{profile}'")
+    return number
+
+def _compile_profile(profile: str, raw: Dict[str, str]) -> Dict:
+    """Validate one profile's raw string values into its compiled form"""
+    host = raw.get("host", "")
+    auth_token = raw.get("authorization_token", "")
+    if not host or not auth_token:
+        raise ConfigError(f"host or authorization_token not found in .env file (profile '{profile}')")
+
+    compiled = {"host": normalize_host(host), "authorization_token": auth_token}
+    for key, default in TUNING_DEFAULTS.items():
+        compiled[key] = _to_int(profile, key, raw.get(key, default))
+
+    if compiled["chunk_size_mb"] == 0:
+        raise ConfigError(f"chunk_size_mb must be at least 1 in profile '{profile}'")
+    for key in ("max_workers", "read_buffers", "read_buffer_mb"):
+        if compiled[key] == 0:
+            raise ConfigError(f"{key} must be at least 1 in profile '{profile}'")
+    if compiled["compression"] > 100:
+        raise ConfigError(f"compression must be a percentage (0-100) in profile '{profile}'")
+
+    compiled["pool"] = [name.strip() for name in raw.get("pool", "").split(",") if name.strip()]
+    return compiled
+
+def compile_env(values: Dict[str, str]) -> Dict:
+    """Split raw .env values into profiles and compile each of them"""
+    base = {}
+    per_profile: Dict[str, Dict[str, str]] = {}
+    for key, value in values.items():
+        if PROFILE_SEPARATOR in key:
+            name, _, sub_key = key.partition(PROFILE_SEPARATOR)
+            per_profile.setdefault(name, {})[sub_key] = value
+        else:
+            base[key] = value
+
+    # Keep the raw strings around so env/CLI overrides can be re-validated.
+    # Named profiles inherit the top-level settings, but not its pool or
+    # default-profile choice: `--config lan` means the lan host alone.
+    inherited = {key: value for key, value in base.items() if key not in PROFILE_ONLY_KEYS}
+    raw_profiles = {DEFAULT_PROFILE: base}
+    for name, sub_values in per_profile.items():
+        raw_profiles[name] = {**inherited, **sub_values}
+
+    return {
+        "default_profile": base.get("profile", DEFAULT_PROFILE),
+        "raw": raw_profiles,
+        "compiled": {name: _try_compile(name, raw) for name, raw in raw_profiles.items()},
+    }
+
+def _try_compile(name: str, raw: Dict[str, str]) -> Optional[Dict]:
+    # An incomplete profile is only an error if somebody actually selects it
+    try:
+        return _compile_profile(name, raw)
+    except ConfigError:
+        return None
+
+def _read_disk_cache(env_stat: os.stat_result) -> Optional[Dict]:
+    try:
+        with open(CACHE_PATH) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (cached.get("version") != CACHE_VERSION
+            or cached.get("source") != str(ENV_PATH)
+            or cached.get("mtime_ns") != env_stat.st_mtime_ns
+            or cached.get("size") != env_stat.st_size):
+        return None
+    return cached.get("env")
+
+def _write_disk_cache(env_stat: os.stat_result, compiled_env: Dict):
+    payload = {
+        "version": CACHE_VERSION,
+        "source": str(ENV_PATH),
+        "mtime_ns": env_stat.st_mtime_ns,
+        "size": env_stat.st_size,
+        "env": compiled_env,
+    }
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = CACHE_PATH.with_suffix(".tmp")
+        # The cache holds the auth token, keep it private to the user
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError:
+        pass  # Read-only home etc. - caching is best effort
+
+_compiled_env: Optional[Tuple[Tuple[int, int], Dict]] = None
+
+def load_env() -> Dict:
+    """Return the compiled .env, re-parsing only when the file changed"""
+    global _compiled_env
+
+    try:
+        env_stat = ENV_PATH.stat()
+    except OSError:
+        raise ConfigError(f".env file not found! Edit {ENV_PATH}.example and rename it to {ENV_PATH} to configure.")
+
+    stamp = (env_stat.st_mtime_ns, env_stat.st_size)
+    if _compiled_env is not None and _compiled_env[0] == stamp:
+        return _compiled_env[1]
+
+    compiled_env = _read_disk_cache(env_stat)
+    if compiled_env is None:
+        compiled_env = compile_env(_parse_env_file(ENV_PATH))
+        _write_disk_cache(env_stat, compiled_env)
+
+    _compiled_env = (stamp, compiled_env)
+    return compiled_env
+
+def _env_overrides() -> Dict[str, str]:
+    overrides = {}
+    for key in OVERRIDE_KEYS:
+        value = os.environ.get(f"PASTIT_{key.upper()}")
+        if value:
+            overrides[key] = value
+    return overrides
+
+def resolve_config(profile: Optional[str] = None, overrides: Optional[Dict[str, str]] = None,
+                   use_environment: bool = True) -> Config:
+    """Resolve a profile plus env/CLI overrides into a Config"""
+    compiled_env = load_env()
+    profile = profile or os.environ.get("PASTIT_PROFILE") or compiled_env["default_profile"]
+
+    if profile not in compiled_env["raw"]:
+        known = ", ".join(sorted(compiled_env["raw"]))
+        raise ConfigError(f"Unknown profile '{profile}' (known: {known})")
+
+    merged_overrides = {**(_env_overrides() if use_environment else {}), **(overrides or {})}
+    if merged_overrides:
+        settings = _compile_profile(profile, {**compiled_env["raw"][profile], **merged_overrides})
+    else:
+        settings = compiled_env["compiled"][profile]
+        if settings is None:
+            # Re-run validation to surface the actual error
+            settings = _compile_profile(profile, compiled_env["raw"][profile])
+
+    return Config(
+        profile=profile,
+        host=settings["host"],
+        authorization_token=settings["authorization_token"],
+        chunk_size=settings["chunk_size_mb"] * 1024 * 1024,
+        max_workers=settings["max_workers"],
+        rate_limit=settings["rate_limit_mb"] * 1024 * 1024,
+        compression=settings["compression"],
+        pool=tuple(settings["pool"]),
+        connect_timeout=settings["connect_timeout"],
+        read_timeout=settings["read_timeout"],
+        stall_rate=settings["stall_rate_kb"] * 1024,
+        stall_seconds=settings["stall_seconds"],
+        max_retries=settings["max_retries"],
+        read_buffers=settings["read_buffers"],
+        read_buffer_size=settings["read_buffer_mb"] * 1024 * 1024,
+        keep_history=bool(settings["keep_history"]),
+        encrypt=bool(settings["encrypt"]),
+        optimize_images=bool(settings["optimize_images"]),
+    )
+
+def resolve_pool(config: Config) -> List[Config]:
+    """Expand a config's pool into one Config per upload node"""
+    if not config.pool:
+        return [config]
+    # Members come from their own profiles only: PASTIT_HOST & co. describe the selected
+    # profile, applied to every member they would turn a pool into N copies of one host.
+    # Their own pool entries are not expanded further.
+    return [replace(resolve_config(name, use_environment=False), pool=()) for name in config.pool]
+
+def load_config(profile: Optional[str] = None, overrides: Optional[Dict[str, str]] = None) -> Config:
+    """Load configuration, exiting with a message on error (script entry point helper)"""
+    try:
+        return resolve_config(profile, overrides)
+    except ConfigError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def override_pair(text: str) -> Tuple[str, str]:
+    """argparse type for --set: key=value with a key the config knows, so typos aren't silently ignored"""
+    key, sep, value = text.partition("=")
+    key = key.strip()
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected key=value, got '{text}'")
+    if key not in OVERRIDE_KEYS:
+        raise argparse.ArgumentTypeError(f"unknown key '{key}' (known: {', '.join(OVERRIDE_KEYS)})")
+    return key, value.strip()
+
+def parse_overrides(pairs) -> Dict[str, str]:
+    """Turn the repeated --set pairs into a dict; the last one for a key wins"""
+    return dict(pairs or [])
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Add the shared --config/--set options to a script's parser"""
+    parser.add_argument('--config', dest='config_profile', metavar='PROFILE',
+                        help='Config profile from /etc/pastit/.env to use')
+    parser.add_argument('--set', dest='config_overrides', action='append', metavar='KEY=VALUE', type=override_pair,
+                        help='Override a config value for this run (repeatable)')
+
+def config_from_args(args: argparse.Namespace) -> Config:
+    return load_config(args.config_profile, parse_overrides(args.config_overrides))
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the resolved pastit configuration')
+    add_config_arguments(parser)
+    parser.add_argument('--show-token', action='store_true', help='Print the auth token instead of masking it')
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    values = asdict(config)
+    if not args.show_token:
+        values["authorization_token"] = "*" * 8
+    for key, value in values.items():
+        print(f"{key}={value}")
+
+if __name__ == "__main__":
+    main()
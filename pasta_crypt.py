@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Pasta Crypt - Client-side streaming encryption for uploads
+
+With -e/--encrypt (or encrypt=1 in the profile) the uploaders encrypt the
+file before it leaves the machine, so the Zipline server only ever stores
+ciphertext. The 256-bit key is appended to the printed URL as its fragment
+(https://host/u/abc.bin#<key>); browsers and HTTP clients never send the
+fragment to the server.
+
+Format: a short header followed by AES-256-GCM segments of SEGMENT_SIZE
+plaintext bytes, each with its own 16-byte tag. Segment nonces are a random
+per-file prefix + the segment counter + a last-segment flag, so segments can
+be encrypted independently (pasta_fast encrypts its chunks in parallel and
+the concatenated parts form one valid stream) while reordered, dropped or
+truncated segments fail to decrypt. The header is authenticated with every
+segment. AES-GCM runs in OpenSSL (AES-NI), so encryption keeps up with
+parallel uploads.
+
+Installation:
+   sudo pacman -S python-cryptography  # OR
+   pip install --break-system-packages cryptography
+
+Usage:
+   ./pasta -e secrets.tar                         # Upload encrypted
+   ./pasta_crypt.py get 'https://host/u/abc.bin#KEY' -o secrets.tar
+   ./pasta_crypt.py get URL_PART0#KEY URL_PART1 ... -o big.iso   # pasta_fast parts
+   PASTA_KEY=KEY ./pasta_crypt.py decrypt < file.enc > file
+   PASTA_KEY=KEY ./pasta_crypt.py encrypt < file > file.enc   # used by pastit -e
+   ./pasta_crypt.py keygen
+
+The key can also be given with --key, but command lines are visible to
+other local users (ps, /proc), so scripts should pass it in PASTA_KEY.
+"""
+
+import os
+import sys
+import base64
+import struct
+import argparse
+from urllib.parse import urldefrag
+
+import requests
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+MAGIC = b"PASTAE1"
+KEY_SIZE = 32
+PREFIX_SIZE = 7                 # nonce = prefix(7) + counter(4) + last flag(1)
+TAG_SIZE = 16
+SEGMENT_SIZE = 1024 * 1024      # plaintext bytes per segment; chunk sizes are MB multiples
+HEADER_SIZE = len(MAGIC) + 4 + PREFIX_SIZE
+DOWNLOAD_BLOCK = 1024 * 1024
+KEY_ENV = "PASTA_KEY"           # keys from scripts come in here, not on argv
+
+class DecryptError(Exception):
+    """Raised for a wrong key or a corrupted/truncated ciphertext"""
+
+def require_crypto():
+    """Exit with install instructions when the cryptography package is missing"""
+    if AESGCM is None:
+        print("Error: cryptography not found (needed for --encrypt). Please install with:")
+        print("  sudo pacman -S python-cryptography  # OR")
+        print("  pip install --break-system-packages cryptography")
+        sys.exit(1)
+
+def encode_key(key: bytes) -> str:
+    return base64.urlsafe_b64encode(key).rstrip(b"=").decode()
+
+def decode_key(text: str) -> bytes:
+    try:
+        key = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+    except ValueError:
+        key = b""
+    if len(key) != KEY_SIZE:
+        raise DecryptError("invalid key (expected the part after '#' in the URL)")
+    return key
+
+def segment_count(size: int, segment_size: int = SEGMENT_SIZE) -> int:
+    # An empty file still gets one (empty) final segment so truncation is detectable
+    return max(1, -(-size // segment_size))
+
+def encrypted_size(size: int, segment_size: int = SEGMENT_SIZE) -> int:
+    """Exact ciphertext length for `size` plaintext bytes (for Content-Length)"""
+    return HEADER_SIZE + size + TAG_SIZE * segment_count(size, segment_size)
+
+class StreamCipher:
+    """AES-256-GCM over fixed-size segments with counter nonces.
+
+    Stateless per segment: any segment can be encrypted given its index and
+    whether it is the file's last one.
+    """
+
+    def __init__(self, key: bytes, prefix: bytes, segment_size: int = SEGMENT_SIZE):
+        require_crypto()
+        self.key = key
+        self.prefix = prefix
+        self.segment_size = segment_size
+        self.header = MAGIC + struct.pack(">I", segment_size) + prefix
+        self.aead = AESGCM(key)
+
+    @classmethod
+    def generate(cls) -> "StreamCipher":
+        require_crypto()
+        return cls(AESGCM.generate_key(bit_length=256), os.urandom(PREFIX_SIZE))
+
+    def with_new_prefix(self) -> "StreamCipher":
+        """Same key, fresh nonces: for encrypting the file again (a retry, another mirror),
+        which may have changed in between and must never meet the old nonces"""
+        return StreamCipher(self.key, os.urandom(PREFIX_SIZE), self.segment_size)
+
+    @classmethod
+    def from_header(cls, key: bytes, header: bytes) -> "StreamCipher":
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            raise DecryptError("not a pasta-encrypted file")
+        segment_size, = struct.unpack(">I", header[len(MAGIC):len(MAGIC) + 4])
+        return cls(key, header[len(MAGIC) + 4:HEADER_SIZE], segment_size)
+
+    @property
+    def key_text(self) -> str:
+        return encode_key(self.key)
+
+    def url_with_key(self, url: str) -> str:
+        return f"{url}#{self.key_text}"
+
+    def _nonce(self, index: int, last: bool) -> bytes:
+        return self.prefix + struct.pack(">I?", index, last)
+
+    def encrypt_segment(self, index: int, data, last: bool) -> bytes:
+        return self.aead.encrypt(self._nonce(index, last), data, self.header)
+
+    def decrypt_segment(self, index: int, data, last: bool) -> bytes:
+        try:
+            return self.aead.decrypt(self._nonce(index, last), data, self.header)
+        except InvalidTag:
+            raise DecryptError(f"segment {index} failed authentication (wrong key, corrupted or truncated file)")
+
+    def encrypt_range(self, data, first_segment: int, last: bool) -> bytes:
+        """Encrypt a segment-aligned slice of the file, e.g. one pasta_fast chunk.
+
+        `last` says whether the slice ends the file, so its final segment is flagged.
+        """
+        out = [self.header] if first_segment == 0 else []
+        step = self.segment_size
+        view = memoryview(data)
+        final = first_segment + segment_count(len(view), step) - 1
+        for offset in range(0, max(len(view), 1), step):
+            index = first_segment + offset // step
+            out.append(self.encrypt_segment(index, view[offset:offset + step], last and index == final))
+        return b"".join(out)
+
+def _complete_segments(pending: bytearray, data, step: int):
+    """Yield the segments of pending + data that are known not to be the last one.
+
+    Whatever is left (at most one segment) stays in `pending`. Full segments
+    are sliced straight out of `data`, so large blocks are not copied.
+    """
+    view = memoryview(data)
+    if pending:
+        take = min(step - len(pending), len(view))
+        pending += view[:take]
+        view = view[take:]
+        if len(pending) < step or not len(view):
+            return
+        yield pending
+        pending.clear()
+    while len(view) > step:
+        yield view[:step]
+        view = view[step:]
+    pending += view
+
+class Encryptor:
+    """Incremental encryption for streams whose length may be unknown.
+
+    A full segment is only emitted once more data follows it, so finish()
+    always has a final segment to flag as last.
+    """
+
+    def __init__(self, cipher: StreamCipher):
+        self.cipher = cipher
+        self.pending = bytearray()
+        self.index = 0
+        self.started = False
+
+    def update(self, data) -> bytes:
+        out = []
+        if not self.started:
+            out.append(self.cipher.header)
+            self.started = True
+        for segment in _complete_segments(self.pending, data, self.cipher.segment_size):
+            out.append(self.cipher.encrypt_segment(self.index, segment, False))
+            self.index += 1
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        head = b"" if self.started else self.cipher.header
+        self.started = True
+        last = self.cipher.encrypt_segment(self.index, self.pending, True)
+        self.pending = bytearray()
+        return head + last
+
+class Decryptor:
+    """Incremental decryption; the header is read from the stream itself"""
+
+    def __init__(self, key: bytes):
+        self.key = key
+        self.cipher = None
+        self.pending = bytearray()
+        self.index = 0
+
+    def update(self, data) -> bytes:
+        if self.cipher is None:
+            self.pending += data
+            if len(self.pending) < HEADER_SIZE:
+                return b""
+            self.cipher = StreamCipher.from_header(self.key, bytes(self.pending[:HEADER_SIZE]))
+            data = bytes(self.pending[HEADER_SIZE:])
+            self.pending = bytearray()
+
+        out = []
+        # The last full segment is held back until we know whether it is the final one
+        for segment in _complete_segments(self.pending, data, self.cipher.segment_size + TAG_SIZE):
+            out.append(self.cipher.decrypt_segment(self.index, segment, False))
+            self.index += 1
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        if self.cipher is None or len(self.pending) < TAG_SIZE:
+            raise DecryptError("ciphertext is truncated")
+        return self.cipher.decrypt_segment(self.index, self.pending, True)
+
+def raw_url(url: str) -> str:
+    """Zipline serves viewer pages under /view/ (and /u/ on v4); /raw/ is the file itself"""
+    for prefix in ("/view/", "/u/"):
+        if prefix in url:
+            return url.replace(prefix, "/raw/", 1)
+    return url
+
+def fetch(url: str):
+    """Stream one ciphertext URL, falling back to /raw/ when given a viewer page"""
+    response = requests.get(url, stream=True, timeout=(10, 300))
+    if response.ok and response.headers.get("Content-Type", "").startswith("text/html") and raw_url(url) != url:
+        response.close()
+        response = requests.get(raw_url(url), stream=True, timeout=(10, 300))
+    response.raise_for_status()
+    return response
+
+def download(urls, key: bytes, out):
+    """Download the URLs in order as one ciphertext stream and write the plaintext"""
+    decryptor = Decryptor(key)
+    for url in urls:
+        with fetch(url) as response:
+            for block in response.iter_content(DOWNLOAD_BLOCK):
+                out.write(decryptor.update(block))
+    out.write(decryptor.finish())
+
+def transform(stream_in, out, codec, block_size: int = SEGMENT_SIZE):
+    while True:
+        block = stream_in.read(block_size)
+        if not block:
+            break
+        out.write(codec.update(block))
+    out.write(codec.finish())
+
+def main():
+    parser = argparse.ArgumentParser(description='Client-side encryption for pasta uploads')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    get_parser = subparsers.add_parser('get', help='Download and decrypt an encrypted upload')
+    get_parser.add_argument('urls', nargs='+', help='URL with #key (several for pasta_fast parts, in order)')
+    get_parser.add_argument('-k', '--key', help='Key, if the URLs have no #fragment (or set PASTA_KEY)')
+    get_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    decrypt_parser = subparsers.add_parser('decrypt', help='Decrypt stdin to stdout')
+    decrypt_parser.add_argument('-k', '--key', help=f'Key (default: ${KEY_ENV})')
+
+    encrypt_parser = subparsers.add_parser('encrypt', help='Encrypt stdin to stdout')
+    encrypt_parser.add_argument('-k', '--key', help=f'Key (default: ${KEY_ENV})')
+
+    subparsers.add_parser('keygen', help='Print a new random key')
+
+    args = parser.parse_args()
+    require_crypto()
+
+    if args.command == 'keygen':
+        print(encode_key(AESGCM.generate_key(bit_length=256)))
+        return
+
+    # Kept off argv where possible: other users can read command lines, not the environment
+    if args.command in ('encrypt', 'decrypt'):
+        args.key = args.key or os.environ.get(KEY_ENV)
+    if args.command in ('encrypt', 'decrypt') and not args.key:
+        print(f"Error: no key given; set {KEY_ENV} or use --key")
+        sys.exit(1)
+
+    output_path = getattr(args, 'output', None)
+    if output_path is None and sys.stdout.isatty():
+        print("Error: refusing to write binary data to a terminal, use -o FILE or redirect stdout")
+        sys.exit(1)
+
+    try:
+        if args.command == 'encrypt':
+            cipher = StreamCipher(decode_key(args.key), os.urandom(PREFIX_SIZE))
+            transform(sys.stdin.buffer, sys.stdout.buffer, Encryptor(cipher))
+        elif args.command == 'decrypt':
+            transform(sys.stdin.buffer, sys.stdout.buffer, Decryptor(decode_key(args.key)))
+        else:
+            urls, fragments = zip(*(urldefrag(url) for url in args.urls))
+            key_text = (args.key or next((fragment for fragment in fragments if fragment), None)
+                        or os.environ.get(KEY_ENV))
+            if not key_text:
+                print(f"Error: no key given; pass the full URL including '#...', use --key or set {KEY_ENV}")
+                sys.exit(1)
+            key = decode_key(key_text)
+            if output_path:
+                # Written next to the target and renamed, so a failed check leaves no plaintext behind
+                partial = f"{output_path}.part"
+                try:
+                    with open(partial, 'wb') as out:
+                        download(urls, key, out)
+                    os.replace(partial, output_path)
+                finally:
+                    if os.path.exists(partial):
+                        os.unlink(partial)
+            else:
+                download(urls, key, sys.stdout.buffer)
+    except DecryptError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except requests.RequestException as e:
+        print(f"Error: Download failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
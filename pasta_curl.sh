@@ -0,0 +1,10 @@
+# Shared curl timeout/stall/retry policy for pasta, pastit and shortenit.
+# Sourced after the .env, so it picks up the same knobs as the python
+# uploaders (pasta_policy.py).
+#
+# curl aborts when throughput stays under --speed-limit bytes/s for --speed-time seconds,
+# and --retry backs off exponentially on timeouts, 408, 429 and 5xx. Only add
+# curl_retry to requests that are safe to repeat (see is_retryable).
+curl_policy=(--connect-timeout "${connect_timeout:-10}"
+             --speed-limit "$(( ${stall_rate_kb:-16} * 1024 ))" --speed-time "${stall_seconds:-30}")
+curl_retry=(--retry "${max_retries:-4}")
@@ -4,12 +4,23 @@ Pasta Fast - Chunked parallel file uploader for maximum bandwidth usage
 
 This version splits large files into chunks and uploads them in parallel,
 similar to how IDM works, to saturate high-bandwidth connections.
+
+Pipes and other non-seekable inputs are streamed: chunks are read into a
+pool of at most (max_workers + 2) chunk-sized buffers, allocated as needed,
+and each one is handed to the workers as soon as it fills, so memory stays
+bounded whatever the size.
+
+Usage:
+   ./pasta_fast.py big.iso                  # 10MB chunks, 8 connections (config defaults)
+   ./pasta_fast.py big.iso 0 64 16          # No view limit, 64MB chunks, 16 connections
+   pg_dump db | ./pasta_fast.py - --name db.sql
+   ./pasta_fast.py --cprofile big.iso       # Also write a profile report (see pasta_profile.py)
 """
 
-import os
 import sys
 import json
 import requests
+import argparse
 import threading
 import hashlib
 from pathlib import Path
@@ -29,13 +40,13 @@ except ImportError:
     print("  pip install --break-system-packages rich")
     sys.exit(1)
 
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    print("Error: python-dotenv not found. Please install with:")
-    print("  sudo pacman -S python-dotenv  # OR") 
-    print("  pip install --break-system-packages python-dotenv")
-    sys.exit(1)
+from pasta_config import Config, add_config_arguments, config_from_args, load_config
+from pasta_crypt import SEGMENT_SIZE, StreamCipher
+from pasta_hosts import HostPool
+from pasta_history import record_upload
+from pasta_multipart import MultipartBody, RateLimiter
+from pasta_pipeline import BufferPool, fill
+from pasta_profile import add_profile_arguments, profiling
 
 @dataclass
 class ChunkInfo:
@@ -45,36 +56,40 @@ class ChunkInfo:
     size: int
     uploaded: int = 0
     url: str = ""
+    file_id: str = ""
+    host: str = ""
     error: str = ""
+    last: bool = False
 
 class ChunkedUploader:
-    def __init__(self, file_path: str, max_views: int = 0, chunk_size: int = 10*1024*1024, max_workers: int = 8):
+    def __init__(self, file_path: str, max_views: int = 0, chunk_size: int = 0, max_workers: int = 0,
+                 config: Config = None, encrypt: bool = False, name: str = None):
         self.file_path = Path(file_path)
+        # `-` is stdin; FIFOs, sockets and /dev/fd/N (process substitution) can't be seeked either
+        self.streaming = file_path == '-' or (self.file_path.exists() and not self.file_path.is_file())
+        self.name = name or ("stdin" if file_path == '-' else self.file_path.name)
         self.max_views = max_views
-        self.chunk_size = chunk_size  # 10MB chunks by default
-        self.max_workers = max_workers
+        self.config = config or load_config()
+        # Fall back to the profile's tuning (10MB x 8 unless configured)
+        self.chunk_size = chunk_size or self.config.chunk_size
+        self.max_workers = max_workers or self.config.max_workers
+        self.cipher = StreamCipher.generate() if encrypt or self.config.encrypt else None
+        if self.cipher:
+            # Chunks must start on a segment boundary to be encrypted independently
+            self.chunk_size = -(-self.chunk_size // SEGMENT_SIZE) * SEGMENT_SIZE
         self.console = Console()
         self.chunks: List[ChunkInfo] = []
         self.progress = None
         self.task_ids = {}
-        
-    def load_config(self):
-        """Load configuration from .env file"""
-        env_path = Path("/etc/pastit/.env")
-        if not env_path.exists():
-            print(".env file not found! Edit /etc/pastit/.env.example and rename it to /etc/pastit/.env to configure.")
-            sys.exit(1)
-        
-        load_dotenv(env_path)
-        
-        host = os.getenv("host")
-        auth_token = os.getenv("authorization_token")
-        
-        if not host or not auth_token:
-            print("Error: host or authorization_token not found in .env file")
-            sys.exit(1)
-        
-        return host, auth_token
+        self.pool = None
+        self.extra_headers = {}  # e.g. x-zipline-deletes-at for throwaway uploads
+        # One limiter for all workers, so rate_limit_mb caps the whole upload
+        self.limiter = RateLimiter(self.config.rate_limit) if self.config.rate_limit else None
+    
+    @property
+    def upload_name(self) -> str:
+        # The server never learns the real name of an encrypted file
+        return "encrypted.bin" if self.cipher else self.name
     
     def create_chunks(self) -> List[ChunkInfo]:
         """Split file into chunks"""
@@ -90,7 +105,8 @@ class ChunkedUploader:
                 chunk_id=chunk_id,
                 start=start,
                 end=end,
-                size=end - start
+                size=end - start,
+                last=end == file_size
             )
             chunks.append(chunk)
             
@@ -99,39 +115,64 @@ class ChunkedUploader:
         
         return chunks
     
-    def upload_chunk(self, chunk: ChunkInfo, host: str, auth_token: str) -> ChunkInfo:
-        """Upload a single chunk"""
-        url = f"{host}/api/upload"
-        
-        # Create headers for this chunk
+    def upload_chunk(self, chunk: ChunkInfo, chunk_data=None) -> ChunkInfo:
+        """Upload a single chunk to the least-loaded healthy host"""
+        # Create headers for this chunk (auth comes from whichever host takes it)
         headers = {
-            "Authorization": auth_token,
-            "x-zipline-format": "gfycat",
             "x-zipline-chunk-id": str(chunk.chunk_id),
-            "x-zipline-chunk-total": str(len(self.chunks)),
-            "x-zipline-original-name": self.file_path.name,
+            "x-zipline-original-name": self.upload_name,
         }
+        # A stream's chunk count is only known once it has been read to the end
+        if not self.streaming:
+            headers["x-zipline-chunk-total"] = str(len(self.chunks))
         
         if self.max_views > 0:
             headers["x-zipline-max-views"] = str(self.max_views)
+        headers.update(self.extra_headers)
         
         try:
-            # Read chunk data
-            with open(self.file_path, 'rb') as f:
-                f.seek(chunk.start)
-                chunk_data = f.read(chunk.size)
+            if self.cipher:
+                # Read chunk data (streamed chunks arrive already read)
+                if chunk_data is None:
+                    with open(self.file_path, 'rb') as f:
+                        f.seek(chunk.start)
+                        chunk_data = f.read(chunk.size)
+                # Segment numbering continues across chunks, so the parts concatenate into one stream
+                chunk_data = self.cipher.encrypt_range(chunk_data, chunk.start // SEGMENT_SIZE, chunk.last)
             
             # Create filename for this chunk
-            chunk_filename = f"{self.file_path.name}.part{chunk.chunk_id:03d}"
+            chunk_filename = f"{self.upload_name}.part{chunk.chunk_id:03d}"
             
-            # Upload chunk
-            files = {'file': (chunk_filename, chunk_data, 'application/octet-stream')}
+            # Upload chunk; retries, timeouts and failover come from the pool's policy
+            def send(node_config):
+                if chunk_data is not None:
+                    # Pooled stream buffers are sent in place rather than copied to bytes
+                    body = MultipartBody(chunk_data, chunk_filename)
+                else:
+                    # Plain file chunks stream straight from disk instead of being read whole;
+                    # two half-size buffers keep each worker within one read buffer of memory
+                    body = MultipartBody(self.file_path, chunk_filename, buffers=2,
+                                         buffer_size=max(1, self.config.read_buffer_size // 2),
+                                         offset=chunk.start, length=chunk.size)
+                with body:
+                    body.stall = self.pool.policy.stall_monitor()
+                    body.limiter = self.limiter
+                    return requests.post(
+                        node_config.upload_url,
+                        data=body,
+                        headers={**node_config.upload_headers(), **headers, 'Content-Type': body.content_type},
+                        timeout=self.pool.policy.timeout
+                    )
             
-            response = requests.post(url, files=files, headers=headers)
+            node, response = self.pool.upload(send)
             
             if response.status_code == 200:
                 result = response.json()
                 chunk.url = result['files'][0]['url']
+                if self.cipher:
+                    chunk.url = self.cipher.url_with_key(chunk.url)
+                chunk.file_id = str(result['files'][0].get('id', ''))
+                chunk.host = node.config.host
                 chunk.uploaded = chunk.size
                 
                 # Update progress
@@ -147,35 +188,126 @@ class ChunkedUploader:
             chunk.error = str(e)
             return chunk
     
+    def upload_buffered(self, chunk: ChunkInfo, buffers: BufferPool, buf: bytearray) -> ChunkInfo:
+        """Upload a streamed chunk, then hand its buffer back to the reader"""
+        try:
+            return self.upload_chunk(chunk, memoryview(buf)[:chunk.size])
+        finally:
+            buffers.put(buf)
+    
+    def add_progress_task(self, chunk: ChunkInfo):
+        if self.progress:
+            self.task_ids[chunk.chunk_id] = self.progress.add_task(f"{chunk.chunk_id}", total=chunk.size)
+    
+    def submit_stream(self, executor: ThreadPoolExecutor) -> list:
+        """Read the input into pooled chunk buffers, submitting each one as it fills.
+        
+        At most max_workers + 2 buffers exist: one per upload in flight, the one
+        being filled and the one held back until the next read tells whether it
+        was the final chunk (encryption needs to know). Reading blocks while
+        every buffer is busy, so a fast pipe can't outrun the uploads.
+        """
+        buffers = BufferPool(self.max_workers + 2, self.chunk_size)
+        stop = threading.Event()
+        futures = []
+        held = None
+        offset = 0
+        
+        def submit(buf, size, last):
+            nonlocal offset
+            chunk = ChunkInfo(chunk_id=len(self.chunks), start=offset, end=offset + size, size=size, last=last)
+            offset += size
+            self.chunks.append(chunk)
+            self.add_progress_task(chunk)
+            futures.append(executor.submit(self.upload_buffered, chunk, buffers, buf))
+        
+        source = sys.stdin.buffer if str(self.file_path) == '-' else open(self.file_path, 'rb', buffering=0)
+        try:
+            while True:
+                # A failed part can't be re-read from a pipe, so stop consuming input
+                if any(future.done() and future.result().error for future in futures):
+                    if held:
+                        buffers.put(held[0])
+                    break
+                
+                buf = buffers.get(stop)
+                size = fill(source, memoryview(buf)[:self.chunk_size])
+                if held:
+                    submit(*held, last=size == 0)
+                    held = None
+                if size == 0:
+                    buffers.put(buf)
+                    break
+                held = (buf, size)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        
+        if not self.chunks:
+            print("Error: Nothing to upload, the input is empty")
+            sys.exit(1)
+        return futures
+    
+    def run_uploads(self) -> Tuple[List[ChunkInfo], List[ChunkInfo]]:
+        """Upload every chunk in parallel; returns (completed, failed)"""
+        completed_chunks = []
+        failed_chunks = []
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if self.streaming:
+                futures = self.submit_stream(executor)
+            else:
+                futures = [executor.submit(self.upload_chunk, chunk) for chunk in self.chunks]
+            
+            # Collect results
+            for future in as_completed(futures):
+                chunk = future.result()
+                if chunk.error:
+                    failed_chunks.append(chunk)
+                else:
+                    completed_chunks.append(chunk)
+        
+        return completed_chunks, failed_chunks
+    
     def upload_parallel(self, interactive: bool = True):
         """Upload file using parallel chunks"""
-        host, auth_token = self.load_config()
-        
-        if not self.file_path.exists():
+        if not self.streaming and not self.file_path.exists():
             print(f"Error: File '{self.file_path}' not found")
             sys.exit(1)
         
-        file_size = self.file_path.stat().st_size
-        self.chunks = self.create_chunks()
+        if not self.streaming:
+            file_size = self.file_path.stat().st_size
+            self.chunks = self.create_chunks()
+        self.pool = HostPool.from_config(self.config)
         
         if interactive:
-            self.console.print(f"🚀 [bold green]Fast uploading file:[/bold green] {self.file_path.name}")
+            self.console.print(f"🚀 [bold green]Fast uploading file:[/bold green] {self.name}")
             if self.max_views > 0:
                 self.console.print(f"📊 [bold blue]Max views:[/bold blue] {self.max_views}")
             
-            # Human readable file size
-            if file_size < 1024:
-                size_str = f"{file_size} B"
-            elif file_size < 1024 * 1024:
-                size_str = f"{file_size / 1024:.1f} KB"
-            elif file_size < 1024 * 1024 * 1024:
-                size_str = f"{file_size / (1024 * 1024):.1f} MB"
+            if self.streaming:
+                self.console.print(f"📦 [bold cyan]Streaming input:[/bold cyan] size known at the end, "
+                                   f"{(self.max_workers + 2) * self.chunk_size // (1024*1024)}MB of buffers")
+                self.console.print(f"🔀 [bold yellow]Chunks:[/bold yellow] {self.chunk_size // (1024*1024)}MB each")
             else:
-                size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
-            
-            self.console.print(f"📦 [bold cyan]File size:[/bold cyan] {size_str}")
-            self.console.print(f"🔀 [bold yellow]Chunks:[/bold yellow] {len(self.chunks)} × {self.chunk_size // (1024*1024)}MB")
+                # Human readable file size
+                if file_size < 1024:
+                    size_str = f"{file_size} B"
+                elif file_size < 1024 * 1024:
+                    size_str = f"{file_size / 1024:.1f} KB"
+                elif file_size < 1024 * 1024 * 1024:
+                    size_str = f"{file_size / (1024 * 1024):.1f} MB"
+                else:
+                    size_str = f"{file_size / (1024 * 1024 * 1024):.1f} GB"
+                
+                self.console.print(f"📦 [bold cyan]File size:[/bold cyan] {size_str}")
+                self.console.print(f"🔀 [bold yellow]Chunks:[/bold yellow] {len(self.chunks)} × {self.chunk_size // (1024*1024)}MB")
             self.console.print(f"🧵 [bold magenta]Parallel connections:[/bold magenta] {self.max_workers}")
+            if self.cipher:
+                self.console.print("🔐 [bold magenta]Encrypted[/bold magenta] (AES-256-GCM, key stays in the URLs)")
+            if len(self.pool.nodes) > 1:
+                healthy = sum(1 for node in self.pool.nodes if node.healthy)
+                self.console.print(f"🌐 [bold blue]Hosts:[/bold blue] {healthy}/{len(self.pool.nodes)} healthy")
             self.console.print()
             
             # Create progress bars for each chunk
@@ -188,47 +320,16 @@ class ChunkedUploader:
             )
             
             with self.progress:
-                # Add task for each chunk
+                # Add task for each chunk (streamed chunks get theirs as they are read)
                 for chunk in self.chunks:
-                    task_id = self.progress.add_task(f"{chunk.chunk_id}", total=chunk.size)
-                    self.task_ids[chunk.chunk_id] = task_id
+                    self.add_progress_task(chunk)
                 
                 # Upload chunks in parallel
-                completed_chunks = []
-                failed_chunks = []
-                
-                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                    # Submit all chunk uploads
-                    future_to_chunk = {
-                        executor.submit(self.upload_chunk, chunk, host, auth_token): chunk
-                        for chunk in self.chunks
-                    }
-                    
-                    # Collect results
-                    for future in as_completed(future_to_chunk):
-                        chunk = future.result()
-                        if chunk.error:
-                            failed_chunks.append(chunk)
-                        else:
-                            completed_chunks.append(chunk)
+                completed_chunks, failed_chunks = self.run_uploads()
         
         else:
             # Silent mode - just upload without progress
-            completed_chunks = []
-            failed_chunks = []
-            
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_to_chunk = {
-                    executor.submit(self.upload_chunk, chunk, host, auth_token): chunk
-                    for chunk in self.chunks
-                }
-                
-                for future in as_completed(future_to_chunk):
-                    chunk = future.result()
-                    if chunk.error:
-                        failed_chunks.append(chunk)
-                    else:
-                        completed_chunks.append(chunk)
+            completed_chunks, failed_chunks = self.run_uploads()
         
         # Handle results
         if failed_chunks:
@@ -237,40 +338,58 @@ class ChunkedUploader:
                 for chunk in failed_chunks:
                     self.console.print(f"  Chunk {chunk.chunk_id}: {chunk.error}")
             print(f"Error: {len(failed_chunks)} chunks failed to upload")
+            if self.streaming:
+                print("Error: The input was not read to the end; re-run the producing command")
             sys.exit(1)
         
         if interactive:
             self.console.print("\n✅ [bold green]All chunks uploaded successfully![/bold green]")
+            if self.streaming:
+                total = sum(chunk.size for chunk in self.chunks)
+                self.console.print(f"📦 [bold cyan]Total:[/bold cyan] {total / (1024 * 1024):.1f} MB in {len(self.chunks)} chunks")
             self.console.print(f"🔗 [bold yellow]URLs:[/bold yellow]")
             for chunk in sorted(completed_chunks, key=lambda c: c.chunk_id):
                 self.console.print(f"  Part {chunk.chunk_id}: {chunk.url}")
+            if self.cipher:
+                self.console.print(f"🔓 [bold blue]Download with:[/bold blue] pasta_crypt.py get <every part URL, in order> "
+                                   f"-o {self.name}")
         else:
             # Silent mode - just print URLs
             for chunk in sorted(completed_chunks, key=lambda c: c.chunk_id):
                 print(chunk.url)
+        
+        # One history entry per part; the parts are separate files on the server
+        for chunk in sorted(completed_chunks, key=lambda c: c.chunk_id):
+            record_upload("pasta_fast", chunk.host, {'id': chunk.file_id or None, 'url': chunk.url},
+                          name=f"{self.name}.part{chunk.chunk_id:03d}", size=chunk.size,
+                          max_views=self.max_views, config=self.config)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: ./pasta_fast.py <file> [max_views] [chunk_size_mb] [max_workers]")
-        print("  file: File to upload")
-        print("  max_views: Maximum number of views (optional, default: 0)")
-        print("  chunk_size_mb: Chunk size in MB (optional, default: 10)")
-        print("  max_workers: Number of parallel uploads (optional, default: 8)")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Chunked parallel file uploader for Zipline server')
+    parser.add_argument('file', help="File to upload, or '-' to stream stdin")
+    parser.add_argument('max_views', nargs='?', type=int, default=0, help='Maximum number of views (optional, default: 0)')
+    parser.add_argument('chunk_size_mb', nargs='?', type=int, default=0,
+                        help='Chunk size in MB (optional, default: chunk_size_mb from config, 10)')
+    parser.add_argument('max_workers', nargs='?', type=int, default=0,
+                        help='Number of parallel uploads (optional, default: max_workers from config, 8)')
+    parser.add_argument('-e', '--encrypt', action='store_true',
+                        help='Encrypt before uploading; the key is added to the part URLs as #fragment')
+    parser.add_argument('-n', '--name', help="Name for the uploaded parts (default: the file's name, 'stdin' for -)")
+    add_config_arguments(parser)
+    add_profile_arguments(parser)
     
-    file_path = sys.argv[1]
-    max_views = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-    chunk_size_mb = int(sys.argv[3]) if len(sys.argv) > 3 else 10
-    max_workers = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+    args = parser.parse_args()
     
     # Convert MB to bytes
-    chunk_size = chunk_size_mb * 1024 * 1024
+    chunk_size = args.chunk_size_mb * 1024 * 1024
     
     # Check if running in interactive mode
     interactive = sys.stdout.isatty()
     
-    uploader = ChunkedUploader(file_path, max_views, chunk_size, max_workers)
-    uploader.upload_parallel(interactive)
+    with profiling(args, "pasta_fast"):
+        uploader = ChunkedUploader(args.file, args.max_views, chunk_size, args.max_workers, config_from_args(args),
+                                   args.encrypt, args.name)
+        uploader.upload_parallel(interactive)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
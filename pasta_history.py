@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Pasta History - Local index of everything uploaded through pasta/pastit
+
+Every upload is recorded in a SQLite database (with an FTS5 full-text index
+over names, paths, URLs, folders and pasted text) so old uploads can be found
+without scrolling Zipline's web UI. The index can be synced against the
+server and used to delete or expire uploads in bulk.
+
+Usage:
+   pasta history                         # Most recent uploads
+   pasta history search "nginx error"    # Full-text search (FTS5 syntax)
+   pasta history show 42                 # Everything known about one upload
+   pasta history delete 42 57            # Delete uploads on the server
+   pasta history delete --match "*.log"  # Delete every upload matching a search
+   pasta history expire --older-than 30d # Delete uploads older than 30 days
+   pasta history sync                    # Pull new server-side uploads
+   pasta history sync --full             # Also notice server-side deletions
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urldefrag
+
+import requests
+
+from pasta_config import Config, ConfigError, add_config_arguments, config_from_args, resolve_pool
+from pasta_policy import Policy
+
+DB_PATH = Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share")) / "pastit" / "history.db"
+HASH_LIMIT = 256 * 1024 * 1024  # larger files are not re-read just to hash them
+CONTENT_LIMIT = 1024 * 1024     # pasted text kept for search, per paste
+SYNC_PAGE_SIZE = 100
+DELETE_WORKERS = 8
+SCHEMA_VERSION = 1              # PRAGMA user_version once the schema is in place and old #keys are scrubbed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    host TEXT NOT NULL,
+    file_id TEXT,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    max_views INTEGER,
+    folder TEXT,
+    content TEXT,
+    created_at REAL NOT NULL,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS uploads_created ON uploads (created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS uploads_remote ON uploads (host, file_id) WHERE file_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS sync_state (
+    host TEXT PRIMARY KEY,
+    last_created_at REAL NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS uploads_fts USING fts5(
+    name, path, url, folder, content, content='uploads', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS uploads_fts_insert AFTER INSERT ON uploads BEGIN
+    INSERT INTO uploads_fts (rowid, name, path, url, folder, content)
+    VALUES (new.id, new.name, new.path, new.url, new.folder, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS uploads_fts_delete AFTER DELETE ON uploads BEGIN
+    INSERT INTO uploads_fts (uploads_fts, rowid, name, path, url, folder, content)
+    VALUES ('delete', old.id, old.name, old.path, old.url, old.folder, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS uploads_fts_update AFTER UPDATE OF name, path, url, folder, content ON uploads BEGIN
+    INSERT INTO uploads_fts (uploads_fts, rowid, name, path, url, folder, content)
+    VALUES ('delete', old.id, old.name, old.path, old.url, old.folder, old.content);
+    INSERT INTO uploads_fts (rowid, name, path, url, folder, content)
+    VALUES (new.id, new.name, new.path, new.url, new.folder, new.content);
+END;
+"""
+
+COLUMNS = "id, source, host, file_id, url, name, path, size, sha256, max_views, folder, created_at, deleted_at"
+
+def connect() -> sqlite3.Connection:
+    # Pasted text and encryption keys end up in here, keep it private to the user
+    DB_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.close(os.open(DB_PATH, os.O_WRONLY | os.O_CREAT, 0o600))
+    for path, mode in ((DB_PATH.parent, 0o700), (DB_PATH, 0o600)):
+        # Also tightens databases created by older versions; SQLite gives -wal/-shm the same mode
+        if path.stat().st_mode & 0o777 != mode:
+            os.chmod(path, mode)
+    db = sqlite3.connect(DB_PATH, timeout=10)
+    db.row_factory = sqlite3.Row
+    # WAL lets a background pastit record while a search is running
+    db.execute("PRAGMA journal_mode=WAL")
+    # Every record opens a connection (once per pasta_fast chunk), so the setup only runs once
+    if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        migrate(db)
+    return db
+
+def migrate(db: sqlite3.Connection):
+    """Create the tables and scrub old #keys; every step is safe to repeat if two processes race"""
+    db.executescript(SCHEMA)
+    try:
+        db.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        pass  # SQLite built without FTS5, search falls back to LIKE
+    # Earlier versions recorded encrypted uploads with their #key; the update trigger reindexes them
+    with db:
+        scrubbed = db.execute("UPDATE uploads SET url = substr(url, 1, instr(url, '#') - 1)"
+                              " WHERE instr(url, '#') > 0").rowcount
+        if scrubbed and has_fts(db):
+            db.execute("INSERT INTO uploads_fts (uploads_fts) VALUES ('optimize')")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def has_fts(db: sqlite3.Connection) -> bool:
+    row = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'uploads_fts'").fetchone()
+    return row is not None
+
+def hash_file(path: Path) -> Optional[str]:
+    try:
+        if path.stat().st_size > HASH_LIMIT:
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+def record_upload(source: str, host: str, response_file: Dict, path=None, name=None, size=None,
+                  sha256=None, max_views=0, folder=None, content=None, config: Optional[Config] = None):
+    """Add one successful upload to the index. Never raises: history must not break uploads."""
+    if config is not None and not config.keep_history:
+        return
+    try:
+        path = Path(path).resolve() if path else None
+        if path is not None and path.is_file():
+            size = size if size is not None else path.stat().st_size
+            sha256 = sha256 or hash_file(path)
+        if content is not None and sha256 is None:
+            sha256 = hashlib.sha256(content.encode()).hexdigest()
+
+        db = connect()
+        with db:
+            db.execute(
+                "INSERT INTO uploads (source, host, file_id, url, name, path, size, sha256,"
+                " max_views, folder, content, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                # The #fragment of an encrypted upload is its key, which stays out of the index
+                (source, host, response_file.get('id'), urldefrag(response_file['url']).url,
+                 name or (path.name if path else response_file.get('name', '')),
+                 str(path) if path else None, size, sha256, max_views or None, folder,
+                 content[:CONTENT_LIMIT] if content else None, time.time()))
+        db.close()
+    except (sqlite3.Error, OSError, KeyError):
+        pass
+
+def parse_age(value: str) -> float:
+    """'90m', '12h', '30d', '2w' -> seconds"""
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+    try:
+        return float(value[:-1]) * units[value[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"invalid age '{value}', use e.g. 90m, 12h, 30d or 2w")
+
+def parse_timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def format_size(size_bytes):
+    """Format file size in human readable format"""
+    if size_bytes is None:
+        return "-"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+def search(db: sqlite3.Connection, query: str, limit: int, include_deleted: bool = False) -> List[sqlite3.Row]:
+    alive = "" if include_deleted else "AND u.deleted_at IS NULL"
+    if has_fts(db):
+        try:
+            return db.execute(
+                f"SELECT {', '.join('u.' + c.strip() for c in COLUMNS.split(','))} FROM uploads_fts"
+                f" JOIN uploads u ON u.id = uploads_fts.rowid WHERE uploads_fts MATCH ? {alive}"
+                f" ORDER BY bm25(uploads_fts), u.created_at DESC LIMIT ?", (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            if query.startswith('"'):
+                raise
+            # Not valid FTS5 query syntax (e.g. "*.log"): search it as a plain phrase
+            query = '"' + query.replace('"', '""') + '"'
+            return search(db, query, limit, include_deleted)
+
+    like = f"%{query.strip(chr(34))}%"
+    return db.execute(
+        f"SELECT {COLUMNS} FROM uploads u WHERE (name LIKE ? OR path LIKE ? OR url LIKE ? OR content LIKE ?)"
+        f" {alive} ORDER BY created_at DESC LIMIT ?", (like, like, like, like, limit)).fetchall()
+
+def match_glob(db: sqlite3.Connection, pattern: str, include_deleted: bool = False) -> List[sqlite3.Row]:
+    """Uploads whose name, path or URL matches a shell-style glob (case-sensitive, like GLOB)"""
+    alive = "" if include_deleted else "AND deleted_at IS NULL"
+    return db.execute(
+        f"SELECT {COLUMNS} FROM uploads WHERE (name GLOB ? OR path GLOB ? OR url GLOB ?) {alive}"
+        f" ORDER BY created_at DESC", (pattern, pattern, pattern)).fetchall()
+
+def confirm(rows: List[sqlite3.Row], assume_yes: bool) -> bool:
+    """Show what a bulk delete would remove and ask; without a terminal only --yes proceeds"""
+    print_rows(rows)
+    if assume_yes:
+        return True
+    if not sys.stdin.isatty():
+        print(f"Error: refusing to delete {len(rows)} uploads without --yes")
+        return False
+    answer = input(f"Delete these {len(rows)} uploads on the server? [y/N] ")
+    return answer.strip().lower() in ("y", "yes")
+
+def recent(db: sqlite3.Connection, limit: int, source: Optional[str] = None,
+           include_deleted: bool = False) -> List[sqlite3.Row]:
+    where, params = [], []
+    if not include_deleted:
+        where.append("deleted_at IS NULL")
+    if source:
+        where.append("source = ?")
+        params.append(source)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    return db.execute(f"SELECT {COLUMNS} FROM uploads {clause} ORDER BY created_at DESC LIMIT ?",
+                      (*params, limit)).fetchall()
+
+def print_rows(rows: Iterable[sqlite3.Row]):
+    rows = list(rows)
+    if not sys.stdout.isatty():
+        for row in rows:
+            print(f"{row['id']}\t{datetime.fromtimestamp(row['created_at']):%Y-%m-%d %H:%M}\t"
+                  f"{row['url']}\t{row['path'] or row['name']}")
+        return
+
+    try:
+        from rich.console import Console
+        from rich.table import Table
+    except ImportError:
+        print("Error: Rich library not found. Please install with:")
+        print("  sudo pacman -S python-rich  # OR")
+        print("  pip install --break-system-packages rich")
+        sys.exit(1)
+
+    table = Table(show_header=True, box=None)
+    table.add_column("#", style="dim", justify="right")
+    table.add_column("When", style="cyan")
+    table.add_column("Via", style="magenta")
+    table.add_column("Name", style="white")
+    table.add_column("Size", style="green", justify="right")
+    table.add_column("URL", style="yellow")
+    for row in rows:
+        name = row['name'] + (" [red](deleted)[/red]" if row['deleted_at'] else "")
+        table.add_row(str(row['id']), f"{datetime.fromtimestamp(row['created_at']):%Y-%m-%d %H:%M}",
+                      row['source'], name, format_size(row['size']), row['url'])
+    Console().print(table)
+
+def host_configs(config: Config) -> Dict[str, Config]:
+    """Every host reachable with the selected profile, for API calls on recorded uploads"""
+    configs = {config.host: config}
+    try:
+        for member in resolve_pool(config):
+            configs.setdefault(member.host, member)
+    except ConfigError as e:
+        print(f"Warning: {e}")
+    return configs
+
+def fetch_page(config: Config, policy: Policy, page: int) -> Dict:
+    response = policy.call(config.host, lambda: requests.get(
+        config.api_url("user/files"),
+        params={"page": page, "perpage": SYNC_PAGE_SIZE, "sortBy": "createdAt", "order": "desc"},
+        headers={"Authorization": config.authorization_token},
+        timeout=policy.timeout))
+    response.raise_for_status()
+    return response.json()
+
+def sync_host(db: sqlite3.Connection, config: Config, full: bool) -> Dict[str, int]:
+    """Pull the server's file list, newest first, stopping at the last synced upload unless `full`"""
+    policy = Policy.from_config(config)
+    state = db.execute("SELECT last_created_at FROM sync_state WHERE host = ?", (config.host,)).fetchone()
+    watermark = state['last_created_at'] if state and not full else 0.0
+    newest = watermark
+    seen = set()
+    stats = {"added": 0, "updated": 0, "gone": 0}
+
+    page = 1
+    while True:
+        data = fetch_page(config, policy, page)
+        files = data.get("page", [])
+        for remote in files:
+            created = parse_timestamp(remote["createdAt"])
+            if created <= watermark:
+                files = []  # Everything older is already indexed
+                break
+            newest = max(newest, created)
+            seen.add(str(remote["id"]))
+            url = remote.get("url") or f"{config.host}/u/{remote['name']}"
+
+            # Uploads recorded locally have the id already; older ones only match by URL
+            existing = db.execute(
+                "SELECT id FROM uploads WHERE host = ? AND (file_id = ? OR (file_id IS NULL AND url = ?))",
+                (config.host, str(remote["id"]), url)).fetchone()
+            if existing:
+                db.execute("UPDATE uploads SET file_id = ?, size = COALESCE(size, ?), deleted_at = NULL"
+                           " WHERE id = ?", (str(remote["id"]), remote.get("size"), existing['id']))
+                stats["updated"] += 1
+            else:
+                db.execute(
+                    "INSERT INTO uploads (source, host, file_id, url, name, size, max_views, created_at)"
+                    " VALUES ('server', ?, ?, ?, ?, ?, ?, ?)",
+                    (config.host, str(remote["id"]), url, remote.get("originalName") or remote["name"],
+                     remote.get("size"), remote.get("maxViews"), created))
+                stats["added"] += 1
+
+        if not files or page >= data.get("pages", page):
+            break
+        page += 1
+
+    if full:
+        # Anything we think is alive on this host but the server no longer lists is gone
+        alive = db.execute("SELECT id, file_id FROM uploads WHERE host = ? AND deleted_at IS NULL"
+                           " AND file_id IS NOT NULL", (config.host,)).fetchall()
+        gone = [row['id'] for row in alive if row['file_id'] not in seen]
+        db.executemany("UPDATE uploads SET deleted_at = ? WHERE id = ?", [(time.time(), i) for i in gone])
+        stats["gone"] = len(gone)
+
+    db.execute("INSERT OR REPLACE INTO sync_state (host, last_created_at, synced_at) VALUES (?, ?, ?)",
+               (config.host, newest, time.time()))
+    db.commit()
+    return stats
+
+def delete_remote(rows: List[sqlite3.Row], configs: Dict[str, Config], dry_run: bool = False) -> int:
+    """Delete uploads on their servers concurrently; returns how many failed"""
+    db = connect()
+    failed = 0
+    targets = []
+    for row in rows:
+        if row['host'] not in configs or not row['file_id']:
+            reason = "unknown host, check --config" if row['host'] not in configs else "no server id, run sync first"
+            print(f"Skipping #{row['id']} {row['url']}: {reason}")
+            failed += 1
+            continue
+        targets.append(row)
+
+    if dry_run:
+        for row in targets:
+            print(f"Would delete #{row['id']} {row['url']}")
+        return failed
+
+    def delete_one(row):
+        config = configs[row['host']]
+        policy = Policy.from_config(config)
+        response = policy.call(config.host, lambda: requests.delete(
+            config.api_url(f"user/files/{row['file_id']}"),
+            headers={"Authorization": config.authorization_token},
+            timeout=policy.timeout))
+        # Already gone on the server counts as deleted
+        return row, response.status_code in (200, 204, 404), response.status_code
+
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        futures = [executor.submit(delete_one, row) for row in targets]
+        for future in as_completed(futures):
+            try:
+                row, ok, status = future.result()
+            except requests.RequestException as e:
+                failed += 1
+                print(f"Error: {e}")
+                continue
+            if ok:
+                db.execute("UPDATE uploads SET deleted_at = ? WHERE id = ?", (time.time(), row['id']))
+                print(f"Deleted #{row['id']} {row['url']}")
+            else:
+                failed += 1
+                print(f"Error: deleting #{row['id']} {row['url']} failed with status {status}")
+    db.commit()
+    db.close()
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pasta history', description='Search and manage the local upload history')
+    add_config_arguments(parser)
+    subparsers = parser.add_subparsers(dest='command')
+
+    list_parser = subparsers.add_parser('list', help='Most recent uploads (default)')
+    list_parser.add_argument('-n', '--limit', type=int, default=20)
+    list_parser.add_argument('--source', help='Only uploads made by this tool (pasta, pastit, pasta_video, ...)')
+    list_parser.add_argument('-a', '--all', action='store_true', help='Include deleted uploads')
+
+    search_parser = subparsers.add_parser('search', help='Full-text search over names, paths, URLs and pasted text')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-n', '--limit', type=int, default=20)
+    search_parser.add_argument('-a', '--all', action='store_true', help='Include deleted uploads')
+
+    show_parser = subparsers.add_parser('show', help='Show one upload, including pasted text')
+    show_parser.add_argument('id', type=int)
+
+    delete_parser = subparsers.add_parser('delete', help='Delete uploads on the server')
+    delete_parser.add_argument('ids', nargs='*', type=int, help='History ids (first column of list/search)')
+    delete_parser.add_argument('--match', metavar='GLOB',
+                               help="Delete every upload whose name, path or URL matches, e.g. '*.part*'")
+    delete_parser.add_argument('--dry-run', action='store_true')
+    delete_parser.add_argument('-y', '--yes', action='store_true', help="Don't ask before deleting --match results")
+
+    expire_parser = subparsers.add_parser('expire', help='Delete uploads older than a given age on the server')
+    expire_parser.add_argument('--older-than', type=parse_age, required=True, metavar='AGE', help='e.g. 12h, 30d, 2w')
+    expire_parser.add_argument('--source', help='Only uploads made by this tool')
+    expire_parser.add_argument('--dry-run', action='store_true')
+    expire_parser.add_argument('-y', '--yes', action='store_true', help="Don't ask before deleting")
+
+    sync_parser = subparsers.add_parser('sync', help='Pull the server-side file list into the index')
+    sync_parser.add_argument('--full', action='store_true', help='Re-scan everything and mark server-side deletions')
+
+    record_parser = subparsers.add_parser('record', help=argparse.SUPPRESS)  # used by the bash scripts
+    record_parser.add_argument('--source', required=True)
+    record_parser.add_argument('--url', required=True)
+    record_parser.add_argument('--id')
+    record_parser.add_argument('--path')
+    record_parser.add_argument('--name')
+    record_parser.add_argument('--max-views', type=int, default=0)
+    record_parser.add_argument('--content-file', help='Text file to index as the paste content')
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(argv + ['list'])
+    command = args.command
+
+    if command == 'record':
+        config = config_from_args(args)
+        content = None
+        if args.content_file:
+            with open(args.content_file, errors='replace') as f:
+                content = f.read(CONTENT_LIMIT)
+        record_upload(args.source, config.host, {"id": args.id, "url": args.url}, path=args.path,
+                      name=args.name, max_views=args.max_views, content=content, config=config)
+        return
+
+    db = connect()
+
+    if command == 'list':
+        print_rows(recent(db, args.limit, args.source, args.all))
+    elif command == 'search':
+        print_rows(search(db, args.query, args.limit, args.all))
+    elif command == 'show':
+        row = db.execute("SELECT * FROM uploads WHERE id = ?", (args.id,)).fetchone()
+        if row is None:
+            print(f"Error: no upload #{args.id} in history")
+            sys.exit(1)
+        for key in row.keys():
+            if key != 'content' and row[key] is not None:
+                value = datetime.fromtimestamp(row[key]) if key.endswith('_at') else row[key]
+                print(f"{key}: {value}")
+        if row['content']:
+            print()
+            print(row['content'])
+    elif command in ('delete', 'expire'):
+        if command == 'delete':
+            rows = [db.execute(f"SELECT {COLUMNS} FROM uploads WHERE id = ?", (i,)).fetchone() for i in args.ids]
+            missing = [i for i, row in zip(args.ids, rows) if row is None]
+            if missing:
+                print(f"Error: no upload {', '.join(f'#{i}' for i in missing)} in history")
+                sys.exit(1)
+            if args.match:
+                rows += match_glob(db, args.match)
+        else:
+            cutoff = time.time() - args.older_than
+            query = f"SELECT {COLUMNS} FROM uploads WHERE deleted_at IS NULL AND created_at < ?"
+            params = [cutoff]
+            if args.source:
+                query += " AND source = ?"
+                params.append(args.source)
+            rows = db.execute(query, params).fetchall()
+
+        rows = list({row['id']: row for row in rows if not row['deleted_at']}.values())
+        if not rows:
+            print("Nothing to delete")
+            return
+        # Ids given one by one are deliberate; anything selected by pattern or age is shown first
+        bulk = command == 'expire' or args.match
+        if bulk and not args.dry_run and not confirm(rows, args.yes):
+            sys.exit(1)
+        failed = delete_remote(rows, host_configs(config_from_args(args)), args.dry_run)
+        if failed:
+            sys.exit(1)
+    elif command == 'sync':
+        for host, config in host_configs(config_from_args(args)).items():
+            try:
+                stats = sync_host(db, config, args.full)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Error: sync with {host} failed: {e}")
+                sys.exit(1)
+            print(f"{host}: {stats['added']} new, {stats['updated']} matched, {stats['gone']} gone on server")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
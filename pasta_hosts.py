@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Pasta Hosts - Upload target pool with health checks, failover and mirroring
+
+A profile with `pool=node1,node2,...` in /etc/pastit/.env spreads uploads over
+those profiles' Zipline instances. Each upload goes to the least-loaded healthy
+node; retryable failures (see pasta_policy.py) mark the node down and the upload
+is retried on the next one, with backoff once every node has been tried.
+Mirroring sends the same file to N distinct nodes in
+parallel and returns every URL.
+
+Usage:
+   ./pasta_hosts.py                 # Health-check every node of the profile's pool
+   ./pasta_hosts.py --config lan    # Same, for another profile
+"""
+
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import requests
+
+from pasta_config import Config, ConfigError, add_config_arguments, config_from_args, resolve_pool
+from pasta_policy import Policy, is_retryable
+
+HEALTH_INTERVAL = 30  # seconds before a node's health is re-checked
+HEALTH_TIMEOUT = 3
+
+class NoHealthyHostError(Exception):
+    """Raised when every node in the pool failed"""
+
+class MirrorShortfallError(NoHealthyHostError):
+    """Raised when only some of the requested mirror copies were uploaded; `results` holds those"""
+
+    def __init__(self, message: str, results: List[Tuple["Node", requests.Response]], requested: int):
+        super().__init__(message)
+        self.results = results
+        self.requested = requested
+
+class Node:
+    def __init__(self, config: Config):
+        self.config = config
+        self.inflight = 0
+        self.healthy = True
+        self.checked_at = 0.0
+        self.last_error = ""
+
+    @property
+    def name(self) -> str:
+        return f"{self.config.profile} ({self.config.host})"
+
+class HostPool:
+    def __init__(self, configs: List[Config], health_interval: float = HEALTH_INTERVAL,
+                 policy: Optional[Policy] = None):
+        self.nodes = [Node(config) for config in configs]
+        self.health_interval = health_interval
+        # Timeouts and retry budget follow the profile the pool was built from
+        self.policy = policy or Policy.from_config(configs[0])
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Config) -> "HostPool":
+        try:
+            # Timeouts and retries from the selected profile, --set/env overrides included
+            pool = cls(resolve_pool(config), policy=Policy.from_config(config))
+        except ConfigError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        # A single node needs no probing, its upload fails loudly on its own
+        if len(pool.nodes) > 1:
+            pool.check_all()
+        return pool
+
+    def check_health(self, node: Node) -> bool:
+        """Probe a node; anything that answers below 500 counts as up"""
+        try:
+            response = requests.get(node.config.api_url("healthcheck"), timeout=HEALTH_TIMEOUT)
+            healthy = response.status_code < 500
+            node.last_error = "" if healthy else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            healthy = False
+            node.last_error = str(e)
+
+        with self.lock:
+            node.healthy = healthy
+            node.checked_at = time.monotonic()
+        return healthy
+
+    def check_all(self):
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            list(executor.map(self.check_health, self.nodes))
+
+    def acquire(self, exclude=()) -> Optional[Node]:
+        """Reserve the least-loaded healthy node not in `exclude`"""
+        now = time.monotonic()
+        stale = [node for node in self.nodes
+                 if node not in exclude and not node.healthy and now - node.checked_at > self.health_interval]
+        for node in stale:
+            self.check_health(node)
+
+        with self.lock:
+            candidates = [node for node in self.nodes if node not in exclude]
+            healthy = [node for node in candidates if node.healthy]
+            # When everything looks down, still try the rest rather than give up untried
+            pool = healthy or candidates
+            if not pool:
+                return None
+            node = min(pool, key=lambda n: n.inflight)
+            node.inflight += 1
+            return node
+
+    def release(self, node: Node, ok: bool, error: str = ""):
+        with self.lock:
+            node.inflight -= 1
+            if not ok:
+                node.healthy = False
+                node.checked_at = time.monotonic()
+                node.last_error = error
+
+    def upload(self, send: Callable[[Config], requests.Response], exclude=()) -> Tuple[Node, requests.Response]:
+        """Run `send` against the best node, failing over on retryable errors.
+
+        Each round tries every remaining node once; between rounds the policy
+        backs off, up to max_retries extra rounds. `send` receives the node's
+        Config and must be safe to call again (reopen files, rebuild encoders)
+        since a failed attempt is replayed elsewhere.
+        """
+        errors = []
+        for attempt in range(self.policy.max_retries + 1):
+            tried = list(exclude)
+            last_response = None
+            while True:
+                node = self.acquire(exclude=tried)
+                if node is None:
+                    break
+                tried.append(node)
+                only_choice = all(other in tried for other in self.nodes)
+
+                try:
+                    response = self.policy.attempt(node.config.host, lambda: send(node.config), only_choice)
+                except Exception as e:
+                    if not is_retryable(error=e):
+                        # The request itself is broken, another node won't help
+                        self.release(node, ok=True)
+                        raise
+                    self.release(node, ok=False, error=str(e))
+                    errors.append(f"{node.name}: {e}")
+                    continue
+
+                if is_retryable(response=response):
+                    self.release(node, ok=False, error=f"HTTP {response.status_code}")
+                    errors.append(f"{node.name}: HTTP {response.status_code}")
+                    last_response = response
+                    continue
+
+                self.release(node, ok=True)
+                return node, response
+
+            if len(tried) == len(exclude):
+                break  # Nothing left to try at all
+            if attempt < self.policy.max_retries:
+                time.sleep(self.policy.backoff(attempt, last_response))
+
+        # Only the last round's errors are interesting
+        raise NoHealthyHostError("; ".join(errors[-len(self.nodes):]) or "no upload hosts configured")
+
+    def mirror(self, send: Callable[[Config], requests.Response], copies: int) -> List[Tuple[Node, requests.Response]]:
+        """Upload the same payload to `copies` distinct nodes in parallel.
+
+        Raises MirrorShortfallError, carrying the copies that did succeed,
+        when fewer than `copies` could be made.
+        """
+        requested = max(1, copies)
+        copies = min(requested, len(self.nodes))
+        used = []
+        used_lock = threading.Lock()
+
+        def one_copy():
+            # Each copy fails over independently but never lands on a node another copy used
+            while True:
+                with used_lock:
+                    node = self.acquire(exclude=used)
+                    if node is None:
+                        raise NoHealthyHostError("not enough healthy hosts for mirroring")
+                    used.append(node)
+                self.release(node, ok=True)
+                try:
+                    return self.upload(send, exclude=[n for n in self.nodes if n is not node])
+                except NoHealthyHostError:
+                    continue
+
+        with ThreadPoolExecutor(max_workers=copies) as executor:
+            futures = [executor.submit(one_copy) for _ in range(copies)]
+            results, errors = [], []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except NoHealthyHostError as e:
+                    errors.append(str(e))
+
+        if not results:
+            raise NoHealthyHostError("; ".join(errors))
+        if len(results) < requested:
+            if len(self.nodes) < requested:
+                errors.append(f"only {len(self.nodes)} hosts configured")
+            raise MirrorShortfallError(f"only {len(results)} of {requested} copies uploaded: {'; '.join(errors)}",
+                                       results, requested)
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Health-check the upload host pool')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    pool = HostPool.from_config(config_from_args(args))
+    if len(pool.nodes) == 1:
+        pool.check_all()
+    for node in pool.nodes:
+        status = "up" if node.healthy else f"DOWN ({node.last_error})"
+        print(f"{node.name}: {status}")
+
+    if not any(node.healthy for node in pool.nodes):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Pasta Image - Shrink screenshots and other images before they are uploaded
+
+PNGs are recompressed losslessly, or converted to WebP/AVIF when a format is
+given, and lose their metadata (text chunks, EXIF, timestamps) on the way;
+the ICC colour profile is kept so colours don't shift. Files that aren't
+PNGs, animated or 16-bit PNGs and results that wouldn't be smaller are left
+alone. A batch is spread over a process pool, one worker per core.
+
+Installation:
+   sudo pacman -S python-pillow  # OR
+   pip install --break-system-packages pillow
+
+Usage:
+   ./pasta -O *.png                             # Optimize, then upload each one
+   ./pasta -O --image-format webp shot.png      # Lossless WebP
+   ./pasta -O --image-format avif --image-quality 60 shot.png
+   ./pasta_image.py *.png                       # Report the savings, upload nothing
+   ./pasta_image.py *.png -o out/               # Write the optimized files to out/
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+FORMATS = {"png": ("PNG", ".png"), "webp": ("WEBP", ".webp"), "avif": ("AVIF", ".avif")}
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+def require_pillow(image_format: str = "png"):
+    """Exit with install instructions when Pillow (or its codec) is missing"""
+    if Image is None:
+        print("Error: Pillow not found (needed for --optimize-images). Please install with:")
+        print("  sudo pacman -S python-pillow  # OR")
+        print("  pip install --break-system-packages pillow")
+        sys.exit(1)
+    if image_format != "png" and not features.check(image_format):
+        print(f"Error: this Pillow build has no {image_format.upper()} support")
+        sys.exit(1)
+
+def is_png(path) -> bool:
+    """Sniff the type from the content; screenshots often have no or the wrong extension"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(PNG_MAGIC)) == PNG_MAGIC
+    except OSError:
+        return False
+
+def png_bit_depth(path) -> int:
+    """Bits per channel from the IHDR chunk, which always comes first"""
+    with open(path, 'rb') as f:
+        header = f.read(len(PNG_MAGIC) + 17)
+    return header[24] if len(header) > 24 else 0
+
+def optimize_image(path: str, image_format: str, quality: int, out_dir: str) -> Optional[Tuple[str, int, int]]:
+    """Worker: write a smaller copy of `path` into out_dir.
+
+    Returns (new path, old size, new size), or None when the file was skipped
+    or the result was not smaller. quality 0 means lossless.
+    """
+    pil_format, extension = FORMATS[image_format]
+    if png_bit_depth(path) == 16:
+        # Pillow loads 16-bit colour as 8-bit, and WebP/AVIF have no 16 bits to keep
+        return None
+    with Image.open(path) as image:
+        if image.format != "PNG" or getattr(image, "is_animated", False):
+            return None
+        image.load()
+        # Only the colour profile survives; text chunks, EXIF and dates are dropped
+        params = {"icc_profile": image.info["icc_profile"]} if "icc_profile" in image.info else {}
+
+        if image_format == "png":
+            params.update(optimize=True, compress_level=9)
+        else:
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            if image_format == "webp":
+                params.update(lossless=quality == 0, quality=quality or 100, method=6)
+            else:
+                params.update(quality=quality, speed=4)
+
+        out_path = Path(out_dir) / (Path(path).stem + extension)
+        image.save(out_path, pil_format, **params)
+
+    old_size, new_size = os.path.getsize(path), out_path.stat().st_size
+    if new_size >= old_size:
+        out_path.unlink()
+        return None
+    return str(out_path), old_size, new_size
+
+def optimize_batch(paths: List[str], image_format: str = "png", quality: int = 0, out_dir: str = None,
+                   workers: int = 0) -> Tuple[Dict[str, Tuple[str, int, int]], str]:
+    """Optimize every PNG among `paths` in parallel.
+
+    Returns ({original path: (optimized path, old size, new size)}, out_dir).
+    Without an out_dir a temporary directory is created; the caller removes it.
+    """
+    require_pillow(image_format)
+    if image_format == "avif" and not quality:
+        print("Error: AVIF is lossy here, give it a quality from 1 to 100 (e.g. 60)")
+        sys.exit(1)
+
+    out_dir = out_dir or tempfile.mkdtemp(prefix="pasta_image_")
+    candidates = [str(path) for path in dict.fromkeys(paths) if is_png(path)]
+    if not candidates:
+        return {}, out_dir
+
+    # Inputs with the same stem would overwrite each other's output, so each gets its own subdirectory
+    targets = []
+    for index, path in enumerate(candidates):
+        target = os.path.join(out_dir, str(index))
+        os.makedirs(target, exist_ok=True)
+        targets.append(target)
+
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(candidates))) as executor:
+        futures = [executor.submit(optimize_image, path, image_format, quality, target)
+                   for path, target in zip(candidates, targets)]
+        for path, future in zip(candidates, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # A broken image is uploaded as-is rather than failing the batch
+                print(f"Warning: could not optimize {path}: {e}", file=sys.stderr)
+                continue
+            if result:
+                results[path] = result
+    return results, out_dir
+
+def add_image_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('-O', '--optimize-images', action='store_true',
+                        help='Recompress PNGs and strip their metadata before uploading (needs Pillow)')
+    parser.add_argument('--image-format', choices=sorted(FORMATS), default='png',
+                        help='Convert PNGs to this format when it is smaller (default: png, lossless)')
+    parser.add_argument('--image-quality', type=int, default=0, metavar='Q',
+                        help='Lossy quality 1-100 for webp/avif (default: 0 = lossless)')
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimize PNG images the way `pasta -O` does')
+    parser.add_argument('files', nargs='+', help='Images to optimize')
+    parser.add_argument('-o', '--output', help='Keep the optimized files in this directory')
+    parser.add_argument('--format', dest='image_format', choices=sorted(FORMATS), default='png')
+    parser.add_argument('--quality', dest='image_quality', type=int, default=0, metavar='Q')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Worker processes (default: one per core)')
+    args = parser.parse_args()
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="pasta_image_")
+    try:
+        results, _ = optimize_batch(args.files, args.image_format, args.image_quality, work_dir, args.jobs)
+        total_old = total_new = 0
+        for path in args.files:
+            if path not in results:
+                print(f"{path}: skipped")
+                continue
+            new_path, old_size, new_size = results[path]
+            total_old += old_size
+            total_new += new_size
+            print(f"{path}: {old_size / 1024:.0f} KB -> {new_size / 1024:.0f} KB "
+                  f"({100 - new_size * 100 / old_size:.0f}% smaller)")
+            if args.output:
+                shutil.move(new_path, os.path.join(args.output, os.path.basename(new_path)))
+        if total_old:
+            print(f"Total: {total_old / 1024:.0f} KB -> {total_new / 1024:.0f} KB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
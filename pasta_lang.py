@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Pasta Lang - Guess a paste's language from its first few KB
+
+pastit names extensionless pastes (piped output, dotfiles) with this so
+Zipline highlights them properly instead of treating everything as bash.
+Checks run cheapest first and stop at the first hit:
+1. magic bytes of binary formats (PNG, PDF, gzip, ELF, ...)
+2. shebang (#!/usr/bin/env python3 -> py)
+3. structure: JSON that parses, XML/HTML, unified diffs
+4. a token classifier scoring keyword/syntax patterns per language
+
+Conclusive results are kept in a small LRU cache keyed by a hash of the first
+bytes, on disk next to the config cache, so the next paste from the same tool
+(same header, same prologue) skips detection. Inconclusive ones are not
+cached, so they always fall back to the --default of the current call.
+
+Usage:
+   command | ./pasta_lang.py               # Print the extension (default: txt)
+   ./pasta_lang.py --default sh < .zshrc    # Fall back to sh when unsure
+   ./pasta_lang.py --explain < file         # Show the classifier scores
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Optional
+
+SAMPLE_SIZE = 4096         # bytes looked at; enough for headers, imports and a few lines of code
+KEY_PREFIX = 256           # bytes hashed for the cache key
+CACHE_ENTRIES = 512
+CACHE_VERSION = 2          # bumped when entries from older versions can't be trusted (v1 stored defaults)
+CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pastit" / "lang.json"
+MIN_SCORE = 4              # classifier score needed to trust a guess
+
+SHEBANGS = {
+    "python": "py", "bash": "sh", "sh": "sh", "dash": "sh", "zsh": "zsh", "fish": "fish",
+    "node": "js", "deno": "ts", "perl": "pl", "ruby": "rb", "php": "php", "lua": "lua",
+    "awk": "awk", "gawk": "awk", "Rscript": "r",
+}
+
+MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "png"), (b"\xff\xd8\xff", "jpg"), (b"GIF8", "gif"), (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "zip"), (b"\x1f\x8b", "gz"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"),
+    (b"(\xb5/\xfd", "zst"), (b"7z\xbc\xaf\x27\x1c", "7z"), (b"\x7fELF", "bin"), (b"SQLite format 3\x00", "db"),
+]
+
+# (pattern, weight) per extension; patterns are matched line-wise on the sample
+TOKEN_RULES = {
+    "py": [(r"^\s*def \w+\(.*\)\s*(->\s*[\w\[\], .]+)?:\s*$", 3), (r"^\s*(from [\w.]+ )?import \w+", 2),
+           (r"^\s*class \w+(\(.*\))?:\s*$", 3), (r"^\s*(elif|except|finally)\b.*:\s*$", 3),
+           (r"\bself\.\w+", 1), (r"^\s*@\w+", 1), (r"\b(None|True|False)\b", 1), (r'^\s*"""', 2),
+           (r"^\s*if __name__ == ['\"]__main__['\"]:", 5), (r"\bprint\(", 1)],
+    "sh": [(r"^\s*(if|while|until) \[\[? .* \]\]?;? ?(then|do)?\s*$", 3), (r"^\s*(fi|done|esac)\s*$", 3),
+           (r"^\s*(export|local|readonly) \w+=", 2), (r"\$\{?\w+\}?", 1), (r"^\s*\w+\(\)\s*\{", 2),
+           (r"\b(echo|grep|sed|awk|xargs|curl)\b", 1), (r"\|\|? ", 1), (r"^\s*(alias|source) ", 2)],
+    "js": [(r"\b(const|let|var) \w+ = ", 2), (r"\bfunction\s*\w*\s*\(", 2), (r"=> ?[{(]?", 2),
+           (r"\b(require\(|module\.exports|console\.log)", 3), (r"^\s*(import .* from |export (default )?)", 2),
+           (r"===|!==", 2), (r"\b(async|await)\b", 1), (r";\s*$", 1)],
+    "ts": [(r":\s*(string|number|boolean|any|void|unknown)\b", 3), (r"^\s*(export )?(interface|type) \w+", 3),
+           (r"^\s*import .* from ", 1), (r"\b(public|private|readonly) \w+", 1)],
+    "c": [(r"^\s*#include\s*[<\"]", 4), (r"^\s*#define ", 2), (r"\b(int|void|char|size_t|struct) \*?\w+\s*\(", 2),
+          (r"\b(printf|malloc|free|sizeof)\s*\(", 2), (r";\s*$", 1)],
+    "cpp": [(r"\bstd::", 4), (r"^\s*#include\s*<\w+>\s*$", 1), (r"\b(template|namespace|nullptr)\b", 3),
+            (r"\b(public|private|protected):", 2)],
+    "go": [(r"^package \w+", 4), (r"^\s*func (\(\w+ \*?\w+\) )?\w+\(", 4), (r":= ", 2), (r"\bfmt\.\w+", 2),
+           (r"\berr != nil\b", 3)],
+    "rs": [(r"^\s*(pub )?fn \w+", 4), (r"\blet mut\b", 3), (r"^\s*use \w+(::\w+)+", 3), (r"\bimpl\b", 2),
+           (r"\b\w+!\(", 1), (r"->\s*(Result|Option|Self)", 2)],
+    "java": [(r"^\s*(public|private|protected) (static )?(final )?(class|void|\w+) \w+", 3),
+             (r"^\s*import java\.", 4), (r"\bSystem\.out\.", 3), (r"^\s*package [\w.]+;", 3), (r"^\s*@Override", 3)],
+    "php": [(r"^<\?php", 8), (r"\$\w+->\w+", 2), (r"\becho \$", 2)],
+    "rb": [(r"^\s*def \w+[?!]?(\(.*\))?\s*$", 2), (r"^\s*end\s*$", 2), (r"^\s*require ['\"]", 3),
+           (r"\bdo \|\w+\|", 3), (r"\bputs\b", 2), (r"^\s*module \w+", 2)],
+    "sql": [(r"^\s*(SELECT|INSERT INTO|UPDATE|DELETE FROM|CREATE (TABLE|INDEX|VIEW)|ALTER TABLE|DROP TABLE)\b", 4),
+            (r"\b(FROM|WHERE|JOIN|GROUP BY|ORDER BY|VALUES)\b", 1), (r";\s*$", 1)],
+    "yaml": [(r"^---\s*$", 2), (r"^\s*[\w.-]+:( [^{}\[\];]+)?\s*$", 1), (r"^\s*- [\w.-]+:", 2),
+             (r"^(apiVersion|kind|metadata|services|version):", 3)],
+    "toml": [(r"^\[[\w.-]+\]\s*$", 2), (r"^\s*[\w.-]+ = (\"|'|\d|true|false|\[)", 2), (r"^\[\[[\w.-]+\]\]\s*$", 3)],
+    "ini": [(r"^\[[\w .-]+\]\s*$", 2), (r"^\s*[\w.-]+\s*=\s*[^=]*$", 1), (r"^\s*[;#]", 1)],
+    "css": [(r"^\s*[.#]?[\w-]+(\s*[>,]\s*[.#]?[\w-]+)*\s*\{\s*$", 2), (r"^\s*[\w-]+:\s*[^;]+;\s*$", 2),
+            (r"@media|@import|!important", 3)],
+    "dockerfile": [(r"^FROM [\w./:-]+", 4), (r"^(RUN|COPY|ADD|WORKDIR|ENTRYPOINT|CMD|EXPOSE|ENV) ", 3)],
+    "makefile": [(r"^[\w.-]+:( [\w./$()-]+)*\s*$", 1), (r"^\t", 1), (r"^\.PHONY:", 5), (r"\$\(\w+\)", 1)],
+    "md": [(r"^#{1,6} \S", 2), (r"^\s*[-*] \[[ x]\] ", 3), (r"\[[^\]]+\]\([^)]+\)", 2), (r"^```", 3),
+           (r"^\s*[-*] \S", 1), (r"\*\*\w[^*]*\*\*", 1)],
+    "log": [(r"^\[?\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}", 3), (r"^\w{3} [ \d]\d \d{2}:\d{2}:\d{2} ", 3),
+            (r"\b(INFO|WARN|WARNING|ERROR|DEBUG|TRACE|FATAL)\b", 1)],
+    "nginx": [(r"^\s*(server|location|upstream|http)\b.*\{\s*$", 3), (r"^\s*(listen|server_name|proxy_pass|root) ", 3)],
+}
+
+# One JSON token after optional whitespace: string, number, literal or punctuation
+JSON_TOKEN = re.compile(r'\s*(?:("(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*")'
+                        r'|(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)|(true|false|null)|([{}\[\]:,]))')
+# What may be left where the sample cut a token in half
+JSON_CUT = re.compile(r'\s*(?:"(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{0,4})?)*'
+                      r'|-?[\d.eE+-]*|t(r(ue?)?)?|f(a(l(se?)?)?)?|n(u(ll?)?)?)\Z')
+
+_compiled = {lang: [(re.compile(pattern, re.M), weight) for pattern, weight in rules]
+             for lang, rules in TOKEN_RULES.items()}
+
+def from_shebang(first_line: str) -> Optional[str]:
+    if not first_line.startswith("#!"):
+        return None
+    words = first_line[2:].strip().split()
+    if not words:
+        return None
+    # `#!/usr/bin/env -S python3 -u` names the interpreter after env's options
+    if Path(words[0]).name == "env":
+        words = [word for word in words[1:] if not word.startswith("-") and "=" not in word] or [""]
+    interpreter = Path(words[0]).name
+    interpreter = re.sub(r"[\d.]+$", "", interpreter)  # python3.12 -> python
+    return SHEBANGS.get(interpreter)
+
+def from_magic(data: bytes) -> Optional[str]:
+    for magic, extension in MAGIC:
+        if data.startswith(magic):
+            return extension
+    return None
+
+def json_prefix(text: str) -> bool:
+    """True when `text` is valid JSON for as far as it goes, i.e. the start of a longer document.
+
+    json.loads can't tell a document cut mid-string from a broken one, so this
+    walks the tokens with a stack and only fails on a real syntax error.
+    """
+    closers, expect, pos = [], "value", 0
+    while True:
+        token = JSON_TOKEN.match(text, pos)
+        if not token:
+            if expect == "end":
+                return not text[pos:].strip()
+            return bool(JSON_CUT.match(text, pos))
+        pos = token.end()
+        string, number, literal, punct = token.groups()
+        if expect == "end":
+            return False
+        if expect in ("value_or_close", "key_or_close") and punct == closers[-1]:
+            closers.pop()
+        elif expect in ("key", "key_or_close"):
+            if string is None:
+                return False
+            expect = "colon"
+            continue
+        elif expect == "colon":
+            if punct != ":":
+                return False
+            expect = "value"
+            continue
+        elif expect == "comma_or_close":
+            if punct == ",":
+                expect = "key" if closers[-1] == "}" else "value"
+                continue
+            if punct != closers[-1]:
+                return False
+            closers.pop()
+        elif punct == "{":
+            closers.append("}")
+            expect = "key_or_close"
+            continue
+        elif punct == "[":
+            closers.append("]")
+            expect = "value_or_close"
+            continue
+        elif punct:
+            return False
+        # A value (or a container) just ended
+        expect = "comma_or_close" if closers else "end"
+
+def from_structure(text: str, complete: bool) -> Optional[str]:
+    stripped = text.lstrip()
+    if stripped[:1] in ("{", "["):
+        try:
+            json.loads(stripped)
+            return "json"
+        except ValueError:
+            # A long document cut off by the sample still counts if nothing went wrong before the cut
+            if not complete and json_prefix(stripped):
+                return "json"
+    head = stripped[:200].lower()
+    if head.startswith(("<!doctype html", "<html")):
+        return "html"
+    if head.startswith("<?xml") or re.match(r"<[\w:-]+( [\w:-]+=\"[^\"]*\")*>", head):
+        return "html" if "<html" in head else "xml"
+    if re.match(r"(diff --git |--- \S+.*\n\+\+\+ |Index: )", stripped):
+        return "diff"
+    return None
+
+def scores(text: str) -> Dict[str, int]:
+    """Classifier scores; every pattern counts at most 3 times so one noisy token can't win alone"""
+    result = {}
+    for lang, rules in _compiled.items():
+        score = 0
+        for pattern, weight in rules:
+            hits = 0
+            for _ in pattern.finditer(text):
+                hits += 1
+                if hits == 3:
+                    break
+            score += weight * hits
+        result[lang] = score
+    return result
+
+def classify(text: str) -> Optional[str]:
+    table = scores(text)
+    # The TypeScript and C++ rules only cover what those add on top of JavaScript and C
+    if table["ts"]:
+        table["ts"] += table["js"]
+    if table["cpp"]:
+        table["cpp"] += table["c"]
+    ranked = sorted(table.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+    if best_score < MIN_SCORE or best_score == runner_up:
+        return None
+    return best
+
+def detect(data: bytes, complete: bool = True) -> Optional[str]:
+    """Extension for a paste starting with `data`, or None when nothing is convincing.
+
+    `complete` says whether `data` is the whole paste rather than a prefix of it.
+    """
+    kind = from_magic(data)
+    if kind:
+        return kind
+    if b"\x00" in data[:1024]:
+        return "bin"
+    text = data.decode("utf-8", errors="replace")
+    first_line = text.split("\n", 1)[0]
+    return from_shebang(first_line) or from_structure(text, complete) or classify(text)
+
+class DetectionCache:
+    """LRU of prefix hash -> extension, persisted as JSON between pastes"""
+
+    def __init__(self, path: Path = CACHE_PATH, size: int = CACHE_ENTRIES):
+        self.path = path
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+        self.dirty = False
+        try:
+            cached = json.loads(self.path.read_text())
+            if cached.get("version") == CACHE_VERSION:
+                self.entries.update(cached["entries"])
+        except (OSError, ValueError, AttributeError, KeyError):
+            pass
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.blake2b(data[:KEY_PREFIX], digest_size=16).hexdigest()
+
+    def get(self, data: bytes) -> Optional[str]:
+        key = self.key(data)
+        if key not in self.entries:
+            return None
+        # Recency only matters in memory; a hit alone isn't worth rewriting the file for
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, data: bytes, extension: str):
+        self.entries[self.key(data)] = extension
+        self.entries.move_to_end(self.key(data))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.path.with_suffix(".tmp")
+            temp.write_text(json.dumps({"version": CACHE_VERSION, "entries": self.entries}))
+            os.replace(temp, self.path)
+        except OSError:
+            pass  # The cache is only an optimization
+
+def detect_cached(data: bytes, default: str = "txt", complete: bool = True, cache: DetectionCache = None) -> str:
+    """detect() through the LRU; only conclusive results are cached, the default is the caller's"""
+    # Short pastes share no meaningful prefix with anything, and are cheap anyway
+    if len(data) < KEY_PREFIX:
+        return detect(data, complete) or default
+    cache = cache or DetectionCache()
+    extension = cache.get(data)
+    if extension is None:
+        extension = detect(data, complete)
+        if extension:
+            cache.put(data, extension)
+            cache.save()
+    return extension or default
+
+def main():
+    parser = argparse.ArgumentParser(description='Guess the language of a paste from its first KB')
+    parser.add_argument('file', nargs='?', help='File to inspect (default: stdin)')
+    parser.add_argument('--default', default='txt', help='Extension when nothing matches (default: txt)')
+    parser.add_argument('--no-cache', action='store_true', help='Always run detection')
+    parser.add_argument('--explain', action='store_true', help='Print the classifier scores')
+    args = parser.parse_args()
+
+    stream = open(args.file, 'rb') if args.file else sys.stdin.buffer
+    with stream:
+        # One byte past the sample tells whether the sample is the whole input
+        data = stream.read(SAMPLE_SIZE + 1)
+    complete = len(data) <= SAMPLE_SIZE
+    data = data[:SAMPLE_SIZE]
+
+    if args.explain:
+        text = data.decode("utf-8", errors="replace")
+        for lang, score in sorted(scores(text).items(), key=lambda item: item[1], reverse=True):
+            if score:
+                print(f"{lang:<12}{score}")
+        print(f"-> {detect(data, complete) or args.default}")
+        return
+
+    if args.no_cache:
+        print(detect(data, complete) or args.default)
+    else:
+        print(detect_cached(data, args.default, complete))
+
+if __name__ == "__main__":
+    main()
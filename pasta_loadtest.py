@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Pasta Loadtest - Drive a Zipline server with synthetic concurrent uploads
+
+Generates uploads through the real engines: small pastes are one
+streamed pasta_multipart body each, huge files go through pasta_fast's chunked
+uploader. Every request goes out exactly once to the selected profile's
+host, with the profile's timeouts but without the host pool's retries and
+circuit breaker, so the errors counted are the server's. Load is
+ramped in steps, either as a number of concurrent clients or as a target
+upload rate, and every step reports request latency percentiles, error
+rates, throughput and the client's own CPU use. The step where throughput
+stops growing while latency or errors climb is reported as the saturation
+point, flagged when the test process itself was CPU-bound at that step.
+
+Uploads are sent with x-zipline-deletes-at (1h by default) so a real server
+cleans up after the test. --local runs everything against a stand-in server
+in this process instead, so the tool works (and can be tried) offline.
+
+Usage:
+   ./pasta loadtest --local                                  # Offline smoke run
+   ./pasta loadtest --workload small --ramp 1,4,16,64        # Concurrent clients
+   ./pasta loadtest --workload mix --mode rate --ramp 5,10,20,40 --step 30
+   ./pasta loadtest --workload huge --huge-mb 512 --ramp 1,2,4
+   ./pasta loadtest --json before.json                       # Keep the numbers
+"""
+
+import os
+import sys
+import json
+import re
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+import requests
+
+try:
+    from rich.console import Console
+    from rich.table import Table
+except ImportError:
+    print("Error: Rich library not found. Please install with:")
+    print("  sudo pacman -S python-rich  # OR")
+    print("  pip install --break-system-packages rich")
+    sys.exit(1)
+
+from pasta_config import TUNING_DEFAULTS, Config, ConfigError, add_config_arguments, parse_overrides, resolve_config
+from pasta_fast import ChunkInfo, ChunkedUploader
+from pasta_hosts import Node
+from pasta_multipart import MultipartBody
+from pasta_policy import Policy
+
+KB = 1024
+MB = 1024 * 1024
+DEFAULT_RAMP = "1,2,4,8,16,32"
+SATURATION_P99_GROWTH = 1.5     # p99 growth between steps that counts as queueing...
+SATURATION_GAIN = 0.25          # ...when throughput gained less than this share of the added load
+CPU_BOUND = 0.9                 # share of one core (the GIL's limit) at which the test process is the bottleneck
+
+@dataclass
+class Sample:
+    kind: str           # "paste" / "chunk" are requests, "huge" is a whole chunked upload
+    latency: float
+    nbytes: int
+    error: str = ""
+
+class Recorder:
+    def __init__(self):
+        self.samples: List[Sample] = []
+        self.lock = threading.Lock()
+
+    def record(self, sample: Sample):
+        with self.lock:
+            self.samples.append(sample)
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Read by server_activate() inside the constructor, so it has to be set on the class:
+    # plenty of backlog so connection refusals don't pose as server errors
+    request_queue_size = 1024
+
+class StandInServer:
+    """Minimal local Zipline: accepts uploads, discards the bodies, answers like /api/upload.
+
+    `capacity` uploads are processed at a time, like a server's worker pool,
+    each taking `latency` plus `ms_per_mb` per MB; the rest wait their turn.
+    That gives the ramp a real saturation point to find.
+    """
+
+    def __init__(self, latency: float = 0.005, capacity: int = 16, ms_per_mb: float = 2.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.ms_per_mb = ms_per_mb
+        self.error_rate = error_rate
+        self.slots = threading.BoundedSemaphore(capacity)
+        self.counter = 0
+        self.cpu = 0.0  # handler CPU seconds, to tell the stand-in's share of the process apart
+        self.lock = threading.Lock()
+        self.server = None
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as two writes; with Nagle on, a keep-alive client waits out its delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle_one_request(self):
+                cpu = time.thread_time()
+                try:
+                    super().handle_one_request()
+                finally:
+                    with stand_in.lock:
+                        stand_in.cpu += time.thread_time() - cpu
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply(200, {"pass": True})
+
+            def do_POST(self):
+                remaining = int(self.headers.get("Content-Length", 0))
+                size = remaining
+                while remaining:
+                    remaining -= len(self.rfile.read(min(remaining, MB)))
+                with stand_in.slots:
+                    time.sleep(stand_in.latency + size / MB * stand_in.ms_per_mb / 1000)
+                if random.random() < stand_in.error_rate:
+                    self._reply(503, {"error": "stand-in failure"})
+                    return
+                with stand_in.lock:
+                    stand_in.counter += 1
+                    file_id = stand_in.counter
+                host = f"http://{self.headers.get('Host')}"
+                self._reply(200, {"files": [{"id": str(file_id), "url": f"{host}/u/{file_id}.bin"}]})
+
+        return Handler
+
+    def start(self) -> str:
+        self.server = StandInHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self.server.serve_forever, name="stand-in", daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+class TimedChunkedUploader(ChunkedUploader):
+    """pasta_fast's uploader with every chunk request timed into a Recorder"""
+
+    def __init__(self, *args, recorder: Recorder, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorder = recorder
+
+    def upload_chunk(self, chunk: ChunkInfo, chunk_data=None) -> ChunkInfo:
+        start = time.monotonic()
+        chunk = super().upload_chunk(chunk, chunk_data)
+        self.recorder.record(Sample("chunk", time.monotonic() - start, chunk.size, short_error(chunk.error)))
+        return chunk
+
+class LoadTarget:
+    """Stands in for the HostPool: one host, one attempt per request, no circuit breaker.
+
+    The pool's breakers are shared process-wide, so under load they open on
+    the server's errors and then fail requests in the client that never reach
+    the server. Pastes go through a keep-alive session per client thread.
+    """
+
+    def __init__(self, config: Config):
+        self.node = Node(config)
+        self.policy = replace(Policy.from_config(config), max_retries=0)
+        self.local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def upload(self, send: Callable[[Config], requests.Response], exclude=()) -> Tuple[Node, requests.Response]:
+        return self.node, send(self.node.config)
+
+def short_error(error) -> str:
+    """Collapse error messages into a few countable classes"""
+    if not error:
+        return ""
+    text = str(error)
+    status = re.search(r"HTTP \d{3}", text)
+    if status:
+        return status.group()
+    for name in ("stalled", "timed out", "Connection refused", "Connection reset"):
+        if name.lower() in text.lower():
+            return name
+    return type(error).__name__ if not isinstance(error, str) else text[:40]
+
+class Workload:
+    """One synthetic upload per run_one() call, picked according to the workload mix"""
+
+    def __init__(self, config: Config, kind: str, paste_kb: int, huge_mb: int, mix_ratio: float,
+                 expire: str, tmpdir: Optional[str] = None):
+        self.config = config
+        self.kind = kind
+        self.mix_ratio = mix_ratio
+        self.recorder = Recorder()
+        self.headers = {"x-zipline-deletes-at": expire} if expire else {}
+
+        self.target = LoadTarget(config)
+
+        self.tmpdir = tempfile.mkdtemp(prefix="pasta_loadtest_", dir=tmpdir)
+        self.paste_path = os.path.join(self.tmpdir, "paste.txt")
+        self.paste_size = paste_kb * KB
+        with open(self.paste_path, 'w') as f:
+            words = ["def", "return", "import", "pasta", "upload", "server", "latency", "=", "(", ")", "\n"]
+            text = " ".join(random.choice(words) for _ in range(self.paste_size))
+            f.write(text[:self.paste_size])
+
+        self.huge_path = os.path.join(self.tmpdir, "huge.bin")
+        self.huge_size = huge_mb * MB if kind != "small" else 0
+        if self.huge_size:
+            with open(self.huge_path, 'wb') as f:
+                for _ in range(huge_mb):
+                    f.write(os.urandom(MB))
+
+    def close(self):
+        for path in (self.paste_path, self.huge_path):
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(self.tmpdir)
+
+    def run_one(self, scheduled: Optional[float] = None):
+        """`scheduled` is when a rate-driven upload should have started; waiting counts as latency"""
+        huge = self.kind == "huge" or (self.kind == "mix" and random.random() < self.mix_ratio)
+        if huge:
+            self._huge(scheduled)
+        else:
+            self._paste(scheduled)
+
+    def _paste(self, scheduled):
+        start = scheduled or time.monotonic()
+
+        def send(node_config):
+            with MultipartBody(self.paste_path, "loadtest.txt", "text/plain") as body:
+                return self.target.session.post(
+                    node_config.upload_url,
+                    data=body,
+                    headers={**node_config.upload_headers(), **self.headers, 'Content-Type': body.content_type},
+                    timeout=self.target.policy.timeout
+                )
+
+        try:
+            _, response = self.target.upload(send)
+            error = "" if response.status_code == 200 else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = short_error(e)
+        self.recorder.record(Sample("paste", time.monotonic() - start, self.paste_size, error))
+
+    def _huge(self, scheduled):
+        start = scheduled or time.monotonic()
+        uploader = TimedChunkedUploader(self.huge_path, config=self.config, recorder=self.recorder)
+        uploader.pool = self.target
+        uploader.extra_headers = self.headers
+        uploader.chunks = uploader.create_chunks()
+        _, failed = uploader.run_uploads()
+        error = short_error(failed[0].error) if failed else ""
+        self.recorder.record(Sample("huge", time.monotonic() - start, self.huge_size, error))
+
+@dataclass
+class StepResult:
+    level: int
+    elapsed: float
+    requests: int
+    errors: int
+    uploads: int
+    megabytes: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    dropped: int = 0
+    error_kinds: dict = field(default_factory=dict)
+    client_cpu: float = 0.0     # share of one core used by the load generator
+    stand_in_cpu: float = 0.0   # ...and by the --local stand-in in the same process
+
+    @property
+    def cpu_bound(self) -> bool:
+        return self.client_cpu + self.stand_in_cpu >= CPU_BOUND
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    @property
+    def request_rate(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def upload_rate(self) -> float:
+        return self.uploads / self.elapsed if self.elapsed else 0.0
+
+def run_step(workload: Workload, mode: str, level: int, duration: float, max_inflight: int,
+             stand_in: Optional[StandInServer] = None) -> StepResult:
+    workload.recorder = Recorder()
+    start = time.monotonic()
+    cpu_start = time.process_time()
+    stand_in_start = stand_in.cpu if stand_in else 0.0
+    stop_at = start + duration
+    dropped = 0
+
+    if mode == "concurrency":
+        # Closed loop: `level` clients, each starting its next upload when the last one finishes
+        def client():
+            while time.monotonic() < stop_at:
+                workload.run_one()
+
+        clients = [threading.Thread(target=client, daemon=True) for _ in range(level)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    else:
+        # Open loop: uploads start on schedule whether or not earlier ones have finished
+        inflight = threading.BoundedSemaphore(max_inflight)
+
+        def scheduled_upload(when):
+            try:
+                workload.run_one(when)
+            finally:
+                inflight.release()
+
+        with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+            interval = 1.0 / level
+            next_start = start
+            while next_start < stop_at:
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if inflight.acquire(blocking=False):
+                    executor.submit(scheduled_upload, next_start)
+                else:
+                    dropped += 1
+                next_start += interval
+
+    elapsed = time.monotonic() - start
+    stand_in_cpu = stand_in.cpu - stand_in_start if stand_in else 0.0
+    client_cpu = time.process_time() - cpu_start - stand_in_cpu
+    samples = workload.recorder.samples
+    requests_ = [s for s in samples if s.kind in ("paste", "chunk")]
+    latencies = sorted(s.latency for s in requests_)
+    errors = [s.error for s in requests_ if s.error]
+    return StepResult(
+        level=level,
+        elapsed=elapsed,
+        requests=len(requests_),
+        errors=len(errors),
+        uploads=sum(1 for s in samples if s.kind in ("paste", "huge") and not s.error),
+        megabytes=sum(s.nbytes for s in requests_ if not s.error) / MB,
+        p50=percentile(latencies, 50),
+        p90=percentile(latencies, 90),
+        p99=percentile(latencies, 99),
+        max=latencies[-1] if latencies else 0.0,
+        dropped=dropped,
+        error_kinds=dict(Counter(errors).most_common(3)),
+        client_cpu=client_cpu / elapsed,
+        stand_in_cpu=stand_in_cpu / elapsed,
+    )
+
+def find_saturation(results: List[StepResult], mode: str):
+    """First step where more load stopped buying throughput; returns (step, reason) or None"""
+    for previous, current in zip(results, results[1:]):
+        if current.error_rate > max(0.01, 2 * previous.error_rate):
+            return current, f"errors rose to {current.error_rate:.1%}"
+        if mode == "rate":
+            if current.dropped or current.upload_rate < 0.9 * current.level:
+                return current, (f"only {current.upload_rate:.1f} of {current.level} uploads/s completed"
+                                 + (f", {current.dropped} could not even start" if current.dropped else ""))
+            continue
+        expected = previous.request_rate * current.level / previous.level
+        flat = current.request_rate < previous.request_rate + SATURATION_GAIN * (expected - previous.request_rate)
+        if flat and current.p99 > SATURATION_P99_GROWTH * previous.p99:
+            return current, (f"throughput flat at {current.request_rate:.1f} req/s while p99 rose "
+                             f"{previous.p99 * 1000:.0f}ms -> {current.p99 * 1000:.0f}ms")
+    return None
+
+def print_step(console: Console, table: Table, result: StepResult):
+    errors = ", ".join(f"{kind} x{count}" for kind, count in result.error_kinds.items())
+    table.add_row(
+        str(result.level), str(result.requests), f"{result.error_rate:.1%}", f"{result.request_rate:.1f}",
+        f"{result.megabytes / result.elapsed:.1f}", f"{result.p50 * 1000:.0f}", f"{result.p90 * 1000:.0f}",
+        f"{result.p99 * 1000:.0f}", f"{result.max * 1000:.0f}", f"{result.client_cpu:.0%}",
+        str(result.dropped or ""), errors,
+    )
+    console.print(f"  step {result.level}: {result.requests} requests, p99 {result.p99 * 1000:.0f}ms, "
+                  f"{result.error_rate:.1%} errors")
+
+def local_config(args, url: str) -> Config:
+    """The selected profile's tuning, pointed at the stand-in; works without any .env"""
+    try:
+        config = resolve_config(args.config_profile, parse_overrides(args.config_overrides))
+    except ConfigError:
+        config = Config(profile="local", host=url, authorization_token="loadtest",
+                        chunk_size=TUNING_DEFAULTS["chunk_size_mb"] * MB, max_workers=TUNING_DEFAULTS["max_workers"],
+                        rate_limit=0, compression=0)
+    return replace(config, host=url, authorization_token="loadtest", pool=(), keep_history=False, encrypt=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pasta loadtest', description='Ramp synthetic upload load against Zipline')
+    parser.add_argument('--workload', choices=['small', 'huge', 'mix'], default='small',
+                        help='Many small pastes, huge chunked uploads, or a mix (default: small)')
+    parser.add_argument('--mode', choices=['concurrency', 'rate'], default='concurrency',
+                        help='Ramp concurrent clients, or a target rate of uploads/s (default: concurrency)')
+    parser.add_argument('--ramp', default=DEFAULT_RAMP, help=f'Load levels to step through (default: {DEFAULT_RAMP})')
+    parser.add_argument('--step', type=float, default=10, metavar='SECONDS', help='Duration of each step (default: 10)')
+    parser.add_argument('--paste-kb', type=int, default=4, help='Size of each small paste (default: 4)')
+    parser.add_argument('--huge-mb', type=int, default=64, help='Size of each huge upload (default: 64)')
+    parser.add_argument('--mix-ratio', type=float, default=0.02, help='Share of huge uploads in the mix (default: 0.02)')
+    parser.add_argument('--max-inflight', type=int, default=256, help='Open uploads allowed in rate mode (default: 256)')
+    parser.add_argument('--abort-error-rate', type=float, default=0.5,
+                        help='Stop ramping once a step fails this share of requests (default: 0.5)')
+    parser.add_argument('--expire', default='1h', help="x-zipline-deletes-at for test uploads, '' to keep them (default: 1h)")
+    parser.add_argument('--json', metavar='FILE', help='Also write the step results as JSON')
+    parser.add_argument('--local', action='store_true', help='Test against a local stand-in server instead')
+    parser.add_argument('--local-capacity', type=int, default=16, help='Stand-in uploads processed at once (default: 16)')
+    parser.add_argument('--local-latency', type=float, default=5, metavar='MS', help='Stand-in base latency (default: 5)')
+    parser.add_argument('--local-error-rate', type=float, default=0.0, help='Stand-in share of 503 replies (default: 0)')
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        levels = [int(level) for level in args.ramp.split(",") if level.strip()]
+    except ValueError:
+        levels = []
+    if not levels or min(levels) < 1:
+        print(f"Error: --ramp expects positive integers like {DEFAULT_RAMP}")
+        sys.exit(1)
+
+    console = Console()
+    stand_in = None
+    if args.local:
+        stand_in = StandInServer(args.local_latency / 1000, args.local_capacity, error_rate=args.local_error_rate)
+        config = local_config(args, stand_in.start())
+    else:
+        try:
+            config = resolve_config(args.config_profile, parse_overrides(args.config_overrides))
+        except ConfigError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        config = replace(config, keep_history=False, encrypt=False)
+
+    workload = Workload(config, args.workload, args.paste_kb, args.huge_mb, args.mix_ratio, args.expire)
+    unit = "clients" if args.mode == "concurrency" else "uploads/s"
+    target = "local stand-in" if args.local else config.host
+    console.print(f"🔥 [bold green]Load test:[/bold green] {args.workload} workload against {target}, "
+                  f"ramping {args.ramp} {unit}, {args.step:.0f}s per step")
+
+    table = Table(title="Results")
+    for column in ("level", "requests", "errors", "req/s", "MB/s", "p50 ms", "p90 ms", "p99 ms", "max ms",
+                   "client cpu", "dropped", "top errors"):
+        table.add_column(column, justify="right" if column != "top errors" else "left")
+
+    results = []
+    aborted = None
+    try:
+        for level in levels:
+            result = run_step(workload, args.mode, level, args.step, args.max_inflight, stand_in)
+            results.append(result)
+            print_step(console, table, result)
+            if result.error_rate >= args.abort_error_rate:
+                aborted = (result, f"{result.error_rate:.0%} of requests failed")
+                console.print(f"[bold red]Stopping the ramp:[/bold red] {aborted[1]}")
+                break
+    except KeyboardInterrupt:
+        console.print("[yellow]Interrupted, reporting the finished steps[/yellow]")
+    finally:
+        workload.close()
+        if stand_in:
+            stand_in.stop()
+
+    console.print()
+    console.print(table)
+    saturation = find_saturation(results, args.mode) or aborted
+    if saturation:
+        step, reason = saturation
+        healthy = [r.level for r in results if r.level < step.level]
+        console.print(f"📈 [bold yellow]Saturation at {step.level} {unit}:[/bold yellow] {reason}"
+                      + (f" (last healthy level: {healthy[-1]})" if healthy else ""))
+        if step.cpu_bound:
+            share = f"client {step.client_cpu:.0%}" + (f", stand-in {step.stand_in_cpu:.0%}" if stand_in else "")
+            console.print(f"[bold red]The test process was CPU-bound[/bold red] ({share} of a core): "
+                          f"this is the load generator's limit, not the server's")
+    elif results:
+        console.print(f"📈 [bold green]No saturation up to {results[-1].level} {unit}[/bold green]; ramp higher to find it")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"workload": args.workload, "mode": args.mode, "target": target,
+                       "steps": [asdict(result) for result in results],
+                       "saturation": saturation[0].level if saturation else None}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
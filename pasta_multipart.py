@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Pasta Multipart - Lean multipart/form-data body for single-file uploads
+
+Zipline takes one file part per request, so the whole body is a pre-built
+head, the file bytes and a pre-built tail. Content-Length is known up front
+and the bytes are read in large aligned blocks by a PrefetchReader for files
+(optionally a byte range of one, for chunks) or taken from an in-memory
+buffer, then handed to the socket as 256KB memoryview slices with nothing
+copied on the way.
+requests_toolbelt's MultipartEncoder instead pulls small reads through
+several Python layers per request; see `bench_pasta.py multipart`.
+
+Usage:
+   body = MultipartBody("big.iso")                        # Whole file
+   body = MultipartBody("big.iso", "big.iso.part003", offset=30 * MB, length=10 * MB)
+   body = MultipartBody(buffer_view, "stdin.part000")     # bytes/bytearray/memoryview
+   requests.post(url, data=body, headers={'Content-Type': body.content_type})
+"""
+
+import time
+import uuid
+import threading
+from pathlib import Path
+from typing import Optional
+
+from pasta_crypt import Encryptor, encrypted_size
+from pasta_pipeline import DEFAULT_BUFFERS, DEFAULT_BUFFER_SIZE, PrefetchReader
+
+# Most bytes handed to one sendall(). On a plain socket the timeout bounds the whole call,
+# not each send, so an 8MB read buffer in one piece times out on any link under ~1MB/s;
+# small slices also keep progress, stall checks and the rate limit ticking
+SEND_BLOCK = 256 * 1024
+
+class RateLimiter:
+    """Paces bytes to a rate in bytes/sec, across every body that shares it.
+
+    pasta_fast's workers share one, so the cap applies to the upload as a
+    whole rather than to each connection. Time spent idle (a retry backoff,
+    waiting on the server) isn't banked for a burst afterwards.
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self, nbytes: int):
+        """Call after sending `nbytes`; sleeps until the rate allows more"""
+        with self.lock:
+            now = time.monotonic()
+            self.next_time = max(self.next_time, now) + nbytes / self.rate
+            delay = self.next_time - now
+        time.sleep(delay)
+
+class MultipartBody:
+    """Single-part multipart body with an exact length, iterated by requests.
+
+    requests sees __len__ (so it sends a Content-Length) and iterates the
+    body. A file source is read by a PrefetchReader, which keeps the next
+    blocks loading while the current one is on the wire; each block is sent
+    in SEND_BLOCK slices and goes back to the buffer pool once the last one
+    is taken. With a
+    pasta_crypt.StreamCipher a file is encrypted on the way out; in-memory
+    sources are sent as given.
+
+    Iterating again (a retry) starts over from the first byte, re-encrypted
+    under fresh nonces since the file may have changed in between.
+    """
+
+    def __init__(self, source, filename: Optional[str] = None, mime_type: str = 'application/octet-stream',
+                 buffers: int = DEFAULT_BUFFERS, buffer_size: int = DEFAULT_BUFFER_SIZE, rate_limit: int = 0,
+                 cipher=None, offset: int = 0, length: Optional[int] = None):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.data = memoryview(source).cast('B')
+            self.file_path = None
+            self.file_size = len(self.data)
+            if filename is None:
+                raise ValueError("an in-memory body needs a filename")
+            if cipher:
+                raise ValueError("encrypt in-memory bodies before wrapping them (StreamCipher.encrypt_range)")
+        else:
+            if not Path(source).is_file():
+                # A pipe or FIFO stats as 0 bytes: the Content-Length would be wrong and the body empty
+                raise ValueError(f"{source} is not a regular file; stream pipes with pasta_fast.py -")
+            self.data = None
+            self.file_path = source
+            self.file_size = Path(source).stat().st_size - offset if length is None else length
+        self.offset = offset
+        # A 4KB paste doesn't need 4 x 8MB of read buffers
+        self.buffer_size = max(1, min(buffer_size, self.file_size))
+        self.buffers = max(1, min(buffers, -(-self.file_size // self.buffer_size)))
+        self.bytes_read = 0
+        self.callback = None
+        self.stall = None  # optional pasta_policy.StallMonitor
+        # bytes/sec, 0 = unlimited; assign a shared RateLimiter instead to cap several bodies together
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.cipher = cipher
+        self._body = None
+
+        filename = (filename or Path(source).name).replace('"', '%22')
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.head = (f'--{boundary}\r\n'
+                     f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                     f'Content-Type: {mime_type}\r\n\r\n').encode()
+        self.tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    @property
+    def body_size(self) -> int:
+        return encrypted_size(self.file_size) if self.cipher else self.file_size
+
+    def __len__(self):
+        return len(self.head) + self.body_size + len(self.tail)
+
+    def __iter__(self):
+        self.close()
+        self.bytes_read = 0
+        self._body = self._generate_memory() if self.data is not None else self._generate_file()
+        return self._body
+
+    def _generate_memory(self):
+        yield self.head
+        for start in range(0, self.file_size, SEND_BLOCK):
+            block = self.data[start:start + SEND_BLOCK]
+            yield block
+            self._advance(len(block))
+        yield self.tail
+
+    def _generate_file(self):
+        yield self.head
+        # Every pass re-reads the file, so every pass gets its own nonce prefix under the same key
+        encryptor = Encryptor(self.cipher.with_new_prefix()) if self.cipher else None
+        with PrefetchReader(self.file_path, self.buffers, self.buffer_size, self.offset, self.file_size) as reader:
+            for buf, length in reader:
+                view = memoryview(buf)[:length]
+                for start in range(0, length, SEND_BLOCK):
+                    block = view[start:start + SEND_BLOCK]
+                    if encryptor:
+                        # Whole segments come out as they fill up; in between there is nothing to send
+                        ciphertext = encryptor.update(block)
+                        if ciphertext:
+                            yield ciphertext
+                    else:
+                        yield block
+                    self._advance(len(block))
+                # Resumed after the last slice, so the socket has taken all of it: recycle the buffer
+                reader.release(buf)
+        if self.bytes_read != self.file_size:
+            # The Content-Length is already on the wire; a short body would hang the server
+            raise IOError(f"{self.file_path} changed size during the upload "
+                          f"({self.bytes_read} of {self.file_size} bytes)")
+        if encryptor:
+            yield encryptor.finish()
+        yield self.tail
+
+    def _advance(self, length):
+        self.bytes_read += length
+        if self.callback:
+            self.callback(length)
+        if self.stall:
+            self.stall.update(length)
+        if self.limiter:
+            self.limiter.wait(length)
+
+    def close(self):
+        """Stop the reader thread if the upload was abandoned midway"""
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -4,15 +4,11 @@ Pasta Optimized - High-performance single file uploader with chunked streaming
 Optimized for same-server/LAN uploads to maximize throughput
 """
 
-import os
 import sys
 import json
 import requests
 import argparse
 from pathlib import Path
-from io import BytesIO
-import threading
-from queue import Queue
 
 try:
     from rich.console import Console
@@ -23,87 +19,34 @@ except ImportError:
     print("  pip install --break-system-packages rich")
     sys.exit(1)
 
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    print("Error: python-dotenv not found. Please install with:")
-    print("  sudo pacman -S python-dotenv  # OR")
-    print("  pip install --break-system-packages python-dotenv")
-    sys.exit(1)
-
-class StreamingFileUpload:
-    def __init__(self, file_path, chunk_size=8*1024*1024):  # 8MB chunks
-        self.file_path = file_path
-        self.chunk_size = chunk_size
-        self.file = open(file_path, 'rb')
-        self.file_size = Path(file_path).stat().st_size
-        self.bytes_read = 0
-        self.callback = None
-
-    def read(self, size=-1):
-        """Read method for requests to call"""
-        if size == -1:
-            size = self.chunk_size
-
-        data = self.file.read(size)
-        if data:
-            self.bytes_read += len(data)
-            if self.callback:
-                self.callback(len(data))
-        return data
-
-    def seek(self, offset, whence=0):
-        """Seek method for requests compatibility"""
-        return self.file.seek(offset, whence)
-
-    def tell(self):
-        """Tell method for requests compatibility"""
-        return self.file.tell()
-
-    def close(self):
-        """Close the file"""
-        self.file.close()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *args):
-        self.close()
-
-def load_config():
-    """Load configuration from .env file"""
-    env_path = Path("/etc/pastit/.env")
-    if not env_path.exists():
-        print(".env file not found! Edit /etc/pastit/.env.example and rename it to /etc/pastit/.env to configure.")
-        sys.exit(1)
-
-    load_dotenv(env_path)
-
-    host = os.getenv("host")
-    auth_token = os.getenv("authorization_token")
+from pasta_config import add_config_arguments, config_from_args, load_config
+from pasta_crypt import StreamCipher
+from pasta_hosts import HostPool, NoHealthyHostError
+from pasta_history import record_upload
+from pasta_multipart import MultipartBody
+from pasta_profile import add_profile_arguments, profiling
 
-    if not host or not auth_token:
-        print("Error: host or authorization_token not found in .env file")
-        sys.exit(1)
-
-    return host, auth_token
-
-def upload_file(file_path, max_views=0, interactive=True, permanent=False):
+def upload_file(file_path, max_views=0, interactive=True, permanent=False, config=None,
+                buffers=0, buffer_size=0, encrypt=False):
     """Upload file with optimized streaming"""
-    host, auth_token = load_config()
-    url = f"{host}/api/upload"
+    config = config or load_config()
+    cipher = StreamCipher.generate() if encrypt or config.encrypt else None
+    buffers = buffers or config.read_buffers
+    buffer_size = buffer_size or config.read_buffer_size
+    pool = HostPool.from_config(config)
 
     file_path = Path(file_path)
     if not file_path.exists():
         print(f"Error: File '{file_path}' not found")
         sys.exit(1)
+    if not file_path.is_file():
+        print(f"Error: '{file_path}' is not a regular file; stream pipes with pasta_fast.py -")
+        sys.exit(1)
 
     file_size = file_path.stat().st_size
 
-    # Headers
+    # Headers (auth is added per host)
     headers = {
-        "Authorization": auth_token,
-        "x-zipline-format": "gfycat",
         "x-zipline-original-name": "true",
     }
 
@@ -116,6 +59,40 @@ def upload_file(file_path, max_views=0, interactive=True, permanent=False):
 
     console = Console()
 
+    def send_stream(node_config, callback=None):
+        """One attempt against one host; a retry builds a fresh stream from byte 0"""
+        with MultipartBody(file_path, "encrypted.bin" if cipher else None, buffers=buffers,
+                           buffer_size=buffer_size, rate_limit=config.rate_limit,
+                           cipher=cipher) as stream_file:
+            stream_file.callback = callback
+            stream_file.stall = pool.policy.stall_monitor()
+
+            # Use a session with connection pooling for better performance
+            with requests.Session() as session:
+                # Optimize TCP settings; retries are handled by the pool's policy
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=1,
+                    max_retries=0
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+
+                return session.post(
+                    node_config.upload_url,
+                    data=stream_file,
+                    headers={**node_config.upload_headers(), **headers, 'Content-Type': stream_file.content_type},
+                    stream=False,  # Don't stream response
+                    timeout=pool.policy.timeout  # (connect, read) from the config profile
+                )
+
+    def upload_to_pool(send):
+        try:
+            return pool.upload(send)
+        except NoHealthyHostError as e:
+            print(f"Error: Upload failed on every host: {e}")
+            sys.exit(1)
+
     if interactive:
         # Show file info
         console.print(f"⚡ [bold green]Optimized upload:[/bold green] {file_path.name}")
@@ -123,6 +100,8 @@ def upload_file(file_path, max_views=0, interactive=True, permanent=False):
             console.print(f"♾️  [bold magenta]Permanent upload[/bold magenta] (100 years, unlimited views)")
         elif max_views > 0:
             console.print(f"📊 [bold blue]Max views:[/bold blue] {max_views}")
+        if cipher:
+            console.print("🔐 [bold magenta]Encrypted[/bold magenta] (AES-256-GCM, key stays in the URL)")
 
         # Human readable file size
         if file_size < 1024:
@@ -158,40 +137,19 @@ def upload_file(file_path, max_views=0, interactive=True, permanent=False):
             def progress_callback(bytes_uploaded):
                 progress.update(task, advance=bytes_uploaded)
 
-            # Use streaming upload with large chunks
-            with StreamingFileUpload(file_path, chunk_size=16*1024*1024) as stream_file:  # 16MB chunks
-                stream_file.callback = progress_callback
-
-                # Disable request's own chunking and use our streaming
-                files = {'file': (file_path.name, stream_file, 'application/octet-stream')}
-
-                # Use a session with connection pooling for better performance
-                with requests.Session() as session:
-                    # Optimize TCP settings
-                    adapter = requests.adapters.HTTPAdapter(
-                        pool_connections=1,
-                        pool_maxsize=1,
-                        max_retries=0
-                    )
-                    session.mount('http://', adapter)
-                    session.mount('https://', adapter)
-
-                    response = session.post(
-                        url,
-                        files=files,
-                        headers=headers,
-                        stream=False,  # Don't stream response
-                        timeout=(10, None)  # 10 second connection timeout, no read timeout
-                    )
+            def send(node_config):
+                # Restart the bar if a failed host already consumed part of the file
+                progress.reset(task, total=file_size)
+                return send_stream(node_config, progress_callback)
+
+            node, response = upload_to_pool(send)
 
         console.print()
         console.print("✅ [bold green]Upload complete![/bold green]")
 
     else:
         # Silent mode for automation
-        with open(file_path, 'rb') as f:
-            files = {'file': (file_path.name, f, 'application/octet-stream')}
-            response = requests.post(url, files=files, headers=headers)
+        node, response = upload_to_pool(send_stream)
 
     if response.status_code != 200:
         print(response.text)
@@ -200,13 +158,18 @@ def upload_file(file_path, max_views=0, interactive=True, permanent=False):
 
     try:
         result = response.json()
-        file_url = result['files'][0]['url']
+        file_info = result['files'][0]
+        file_url = file_info['url']
 
         # Convert /u/ to /view/
         file_url = file_url.replace('/u/', '/view/')
+        if cipher:
+            file_url = cipher.url_with_key(file_url)
 
         if interactive:
             console.print(f"🔗 [bold yellow]URL:[/bold yellow] {file_url}")
+            if cipher:
+                console.print(f"🔓 [bold blue]Download with:[/bold blue] pasta_crypt.py get '{file_url}' -o {file_path.name}")
         else:
             print(file_url)
 
@@ -214,12 +177,23 @@ def upload_file(file_path, max_views=0, interactive=True, permanent=False):
         print(f"Error: Invalid response format: {e}")
         sys.exit(1)
 
+    record_upload("pasta_optimized", node.config.host, {**file_info, 'url': file_url}, path=file_path,
+                  size=file_size, max_views=0 if permanent else max_views, config=config)
+
 def main():
     parser = argparse.ArgumentParser(description='Optimized file uploader for Zipline server')
     parser.add_argument('file', help='File to upload')
     parser.add_argument('max_views', nargs='?', type=int, default=0, help='Maximum number of views (optional)')
     parser.add_argument('-s', '--silent', action='store_true', help='Silent mode - output only the URL')
     parser.add_argument('-p', '--perm', '--permanent', action='store_true', help='Permanent upload (100 years, unlimited views)')
+    parser.add_argument('--buffers', type=int, default=0,
+                        help='Read-ahead buffers kept in flight (default: read_buffers from config, 4)')
+    parser.add_argument('--buffer-size', type=int, default=0, metavar='MB',
+                        help='Size of each read-ahead buffer in MB (default: read_buffer_mb from config, 8)')
+    parser.add_argument('-e', '--encrypt', action='store_true',
+                        help='Encrypt before uploading; the key is added to the URL as #fragment')
+    add_config_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
@@ -230,7 +204,9 @@ def main():
     # Determine if interactive mode
     interactive = not args.silent and sys.stdout.isatty()
 
-    upload_file(args.file, args.max_views, interactive, args.perm)
+    with profiling(args, "pasta_optimized"):
+        upload_file(args.file, args.max_views, interactive, args.perm, config_from_args(args),
+                    args.buffers, args.buffer_size * 1024 * 1024, args.encrypt)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pasta Pipeline - Bounded producer/consumer reading for streaming uploads
+
+A reader thread fills a fixed pool of reusable bytearrays while the sender
+thread pushes the previous ones to the socket, so disk reads and network
+sends overlap. Memory is capped at buffers x buffer_size and nothing is
+allocated per read.
+"""
+
+import os
+import threading
+from queue import Queue, Empty
+from typing import Iterator, Optional
+
+DEFAULT_BUFFERS = 4
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+ALIGNMENT = 64 * 1024  # keep reads page/readahead friendly
+
+_EOF = object()
+
+def aligned_size(size: int) -> int:
+    """Round a buffer size up to the read alignment"""
+    return max(ALIGNMENT, (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT)
+
+class BufferPool:
+    """Up to `count` reusable bytearrays handed out and returned through a queue.
+
+    Buffers are allocated on demand: a new one is only made when none is free
+    and the cap hasn't been reached, so a short input never pays for the
+    whole pool.
+    """
+
+    def __init__(self, count: int = DEFAULT_BUFFERS, size: int = DEFAULT_BUFFER_SIZE):
+        self.size = aligned_size(size)
+        self.count = max(1, count)
+        self.allocated = 0
+        self.lock = threading.Lock()
+        self.free: Queue = Queue()
+
+    def get(self, stop: threading.Event) -> Optional[bytearray]:
+        """Block for a free buffer; returns None once `stop` is set"""
+        try:
+            return self.free.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            if self.allocated < self.count:
+                self.allocated += 1
+                return bytearray(self.size)
+        while not stop.is_set():
+            try:
+                return self.free.get(timeout=0.1)
+            except Empty:
+                continue
+        return None
+
+    def put(self, buf: bytearray):
+        self.free.put(buf)
+
+def fadvise(fd: int, advice_name: str, offset: int = 0, length: int = 0):
+    """posix_fadvise where the platform has it; a hint, so failures are ignored"""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+def fill(stream, view: memoryview) -> int:
+    """readinto until the view is full or EOF (pipes and sockets return short reads)"""
+    filled = 0
+    while filled < len(view):
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+class PrefetchReader:
+    """Reads a file on a background thread into a BufferPool.
+
+    Iterate to get (buffer, length) pairs in file order and hand each buffer
+    back with release() once it has been sent. Use as a context manager so
+    the reader thread is stopped if the consumer bails out early.
+    """
+
+    def __init__(self, file_path, buffers: int = DEFAULT_BUFFERS, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 offset: int = 0, length: Optional[int] = None):
+        self.file_path = file_path
+        self.pool = BufferPool(buffers, buffer_size)
+        self.offset = offset
+        self.length = length
+        self.filled: Queue = Queue()
+        self.stop = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._read_loop, name="pasta-reader", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _read_loop(self):
+        try:
+            with open(self.file_path, 'rb', buffering=0) as f:
+                fd = f.fileno()
+                fadvise(fd, "POSIX_FADV_SEQUENTIAL", self.offset, self.length or 0)
+                if self.offset:
+                    f.seek(self.offset)
+                # Tracked by hand so pipes/FIFOs (no tell()) work too
+                position = self.offset
+                remaining = self.length
+
+                while not self.stop.is_set() and remaining != 0:
+                    buf = self.pool.get(self.stop)
+                    if buf is None:
+                        return
+                    want = self.pool.size if remaining is None else min(self.pool.size, remaining)
+                    n = fill(f, memoryview(buf)[:want])
+                    if n == 0:
+                        self.pool.put(buf)
+                        break
+                    # Already-read pages won't be needed again, let the kernel drop them
+                    fadvise(fd, "POSIX_FADV_DONTNEED", position, n)
+                    position += n
+                    if remaining is not None:
+                        remaining -= n
+                    self.filled.put((buf, n))
+        except Exception as e:
+            self.filled.put(e)
+            return
+        self.filled.put(_EOF)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self.filled.get()
+            if item is _EOF:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def release(self, buf: bytearray):
+        self.pool.put(buf)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Pasta Policy - Shared timeout, retry and circuit breaker rules for HTTP calls
+
+Every request made by the uploaders goes through a Policy:
+- connect/read timeouts, so a dead server can never hang a job forever
+- stall detection: an upload whose body throughput stays below
+  stall_rate_kb KB/s for stall_seconds is aborted and retried
+- classified errors: connection errors, timeouts, stalls, 408/429 and 5xx are
+  retried, anything else (bad token, 413, ...) fails straight away
+- jittered exponential backoff between attempts, honouring Retry-After
+- a circuit breaker per host that steers traffic away from a node that keeps
+  failing, while another node is left to try
+
+All knobs come from the config profile (see pasta_config.py).
+"""
+
+import time
+import random
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import requests
+
+from pasta_config import Config
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+BREAKER_THRESHOLD = 5     # consecutive failures before a host's circuit opens
+BREAKER_RESET = 30.0      # seconds an open circuit waits before a trial request
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+class StallError(requests.exceptions.Timeout):
+    """Raised from inside a request body when the upload throughput stalls"""
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of contacting a host whose circuit is open"""
+
+class StallMonitor:
+    """Tracks bytes handed to the socket and raises StallError below the minimum rate.
+
+    Feed it from the body's read path or a progress callback. A send that blocks
+    outright is caught by the socket timeout instead, since read() stops being called.
+    """
+
+    def __init__(self, min_rate: int, window: float):
+        self.min_rate = min_rate
+        self.window = window
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+
+    def update(self, nbytes: int):
+        if not self.min_rate or not self.window:
+            return
+        self.window_bytes += nbytes
+        elapsed = time.monotonic() - self.window_start
+        if elapsed < self.window:
+            return
+        rate = self.window_bytes / elapsed
+        if rate < self.min_rate:
+            raise StallError(f"Upload stalled: {rate / 1024:.1f} KB/s over the last {elapsed:.0f}s")
+        self.window_start = time.monotonic()
+        self.window_bytes = 0
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self, only_choice: bool = False) -> bool:
+        """Closed: always. Open: never, until reset_timeout passes; then one trial call.
+
+        A host that is the only choice left always gets its trial: the circuit
+        outlasts the whole retry budget, so refusing would just fail every
+        remaining retry with nowhere else to go.
+        """
+        with self.lock:
+            if self.opened_at is None or only_choice:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True
+            return True
+
+    def record(self, ok: bool):
+        with self.lock:
+            self.trial_running = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def breaker_for(host: str) -> CircuitBreaker:
+    """Breakers are shared process-wide so every worker thread sees a host's state"""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+def is_retryable(response: Optional[requests.Response] = None, error: Optional[BaseException] = None) -> bool:
+    if error is not None:
+        # StallError and CircuitOpenError are subclasses of these two
+        return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                                  requests.exceptions.ChunkedEncodingError))
+    return response is not None and response.status_code in RETRYABLE_STATUS
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After", "")
+    try:
+        return min(float(value), BACKOFF_CAP)
+    except ValueError:
+        return None
+
+@dataclass(frozen=True)
+class Policy:
+    connect_timeout: float = 10
+    read_timeout: float = 300
+    stall_rate: int = 16 * 1024
+    stall_window: float = 30
+    max_retries: int = 4
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Policy":
+        return cls(
+            connect_timeout=config.connect_timeout,
+            read_timeout=config.read_timeout,
+            stall_rate=config.stall_rate,
+            stall_window=config.stall_seconds,
+            max_retries=config.max_retries,
+        )
+
+    @property
+    def timeout(self):
+        """(connect, read) tuple for requests; 0 disables that timeout"""
+        return (self.connect_timeout or None, self.read_timeout or None)
+
+    def stall_monitor(self) -> StallMonitor:
+        return StallMonitor(self.stall_rate, self.stall_window)
+
+    def backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Full-jitter exponential backoff, unless the server said how long to wait"""
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def attempt(self, host: str, send: Callable[[], requests.Response], only_choice: bool = False) -> requests.Response:
+        """One call through the host's circuit breaker; `only_choice` when there's no other host to go to"""
+        breaker = breaker_for(host)
+        if not breaker.allow(only_choice):
+            raise CircuitOpenError(f"Circuit open for {host} after repeated failures")
+        try:
+            response = send()
+        except Exception as e:
+            breaker.record(ok=not is_retryable(error=e))
+            raise
+        breaker.record(ok=not is_retryable(response=response))
+        return response
+
+    def call(self, host: str, send: Callable[[], requests.Response]) -> requests.Response:
+        """Call `send` with retries; returns the last response or re-raises the last error.
+
+        `send` must be safe to repeat (reopen files, rebuild request bodies).
+        """
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                # A single host has no alternative, so the retries are what limit the load
+                response = self.attempt(host, send, only_choice=True)
+            except Exception as e:
+                if last_try or not is_retryable(error=e):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+
+            if last_try or not is_retryable(response=response):
+                return response
+            time.sleep(self.backoff(attempt, response))
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Pasta Profile - Find out where an upload spends its client-side CPU and memory
+
+`--cprofile` on any uploader wraps the run in:
+
+- cProfile, in the main thread and in every thread started during the run
+  (upload workers, read-ahead readers, Rich's refresh thread)
+- per-thread CPU and wall time, grouped by thread kind
+- tracemalloc, sampled in the background; the snapshot taken at the highest
+  traced memory gives the allocation sites at the peak
+
+and writes a plain-text report. Functions are keyed by file and name, not
+line numbers, and paths are shortened, so reports from two versions can be
+compared with `diff -u` or with this script.
+
+Usage:
+   ./pasta --cprofile big.iso                       # Writes pasta-profile-pasta-<time>.txt
+   ./pasta_fast.py --cprofile --cprofile-output new.txt big.iso
+   ./pasta_profile.py old.txt new.txt               # Largest changes between two reports
+"""
+
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import argparse
+import platform
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+SAMPLE_INTERVAL = 0.05          # seconds between tracemalloc peak checks
+# From 3.12 cProfile sits on sys.monitoring, which already sees every thread
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+class ThreadRecord:
+    def __init__(self, name: str):
+        self.name = name
+        self.cpu = 0.0
+        self.wall = 0.0
+        self.profiler: Optional[cProfile.Profile] = None
+
+def thread_group(name: str) -> str:
+    """'ThreadPoolExecutor-0_3' -> 'ThreadPoolExecutor', 'Thread-4 (_fill)' -> 'Thread (_fill)'"""
+    return re.sub(r"-\d+(_\d+)?", "", name)
+
+def short_path(path: str) -> str:
+    """Drop the parts of a path that differ between machines and checkouts"""
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    stdlib = re.search(r"python3\.\d+/(.*)", path)
+    if stdlib:
+        return stdlib.group(1)
+    return os.path.basename(path) if os.path.isabs(path) else path
+
+class Profiler:
+    """Collects cProfile stats, per-thread CPU time and the tracemalloc peak for one run"""
+
+    def __init__(self, script: str, interval: float = SAMPLE_INTERVAL):
+        self.script = script
+        self.interval = interval
+        self.records: List[ThreadRecord] = []
+        self.lock = threading.Lock()
+        self.main = ThreadRecord("MainThread")
+        self.main.profiler = cProfile.Profile()
+        self.peak_snapshot = None
+        self.peak_memory = 0        # highest traced memory seen by the sampler, with its snapshot
+        self.peak_at = 0.0
+        self.true_peak = 0          # tracemalloc's own peak, which can fall between samples
+        self._stop = threading.Event()
+        self._sampler = None
+        self._original_start = None
+
+    def start(self):
+        tracemalloc.start()
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.main_cpu_started = time.thread_time()
+        # The sampler is started before the hook goes in, so it doesn't profile itself
+        self._sampler = threading.Thread(target=self._sample, name="pasta-profile-sampler", daemon=True)
+        self._sampler.start()
+        self._hook_threads()
+        self.main.profiler.enable()
+
+    def stop(self):
+        self.main.profiler.disable()
+        self.main.cpu = time.thread_time() - self.main_cpu_started
+        self.main.wall = self.wall = time.monotonic() - self.started
+        self.cpu = time.process_time() - self.cpu_started
+        threading.Thread.start = self._original_start
+        self._stop.set()
+        self._sampler.join()
+        self._check_peak()
+        self.true_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def _hook_threads(self):
+        """Wrap the run() of every thread started from now on to time (and profile) it"""
+        profiler = self
+        original_start = self._original_start = threading.Thread.start
+
+        def start(thread):
+            run = thread.run
+
+            def timed_run():
+                record = ThreadRecord(thread.name)
+                with profiler.lock:
+                    profiler.records.append(record)
+                wall, cpu = time.monotonic(), time.thread_time()
+                if PER_THREAD_PROFILERS:
+                    record.profiler = cProfile.Profile()
+                    record.profiler.enable()
+                try:
+                    run()
+                finally:
+                    if record.profiler:
+                        record.profiler.disable()
+                    record.cpu = time.thread_time() - cpu
+                    record.wall = time.monotonic() - wall
+
+            # An instance attribute, so subclasses that override run() are covered too
+            thread.run = timed_run
+            return original_start(thread)
+
+        threading.Thread.start = start
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._check_peak()
+
+    def _check_peak(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.peak_memory:
+            self.peak_memory = current
+            self.peak_at = time.monotonic() - self.started
+            self.peak_snapshot = tracemalloc.take_snapshot()
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.main.profiler)
+        for record in self.records:
+            # Threads still running (daemons) have no finished profile to merge
+            if record.profiler and record.wall:
+                stats.add(record.profiler)
+        return stats
+
+    def function_rows(self, stats: pstats.Stats) -> Dict[str, List[float]]:
+        """{'file:function': [calls, tottime, cumtime]}, line numbers folded away"""
+        rows: Dict[str, List[float]] = {}
+        for (filename, _, function), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            key = f"{short_path(filename)}:{function}" if filename != "~" else function
+            row = rows.setdefault(key, [0, 0.0, 0.0])
+            row[0] += calls
+            row[1] += tottime
+            row[2] += cumtime
+        return rows
+
+    def thread_rows(self) -> Dict[str, List[float]]:
+        """{group: [threads, cpu, wall]} including the main thread"""
+        groups: Dict[str, List[float]] = {}
+        for record in [self.main] + self.records:
+            row = groups.setdefault(thread_group(record.name), [0, 0.0, 0.0])
+            row[0] += 1
+            row[1] += record.cpu
+            row[2] += record.wall
+        return groups
+
+    def report(self, argv: List[str]) -> str:
+        stats = self.stats()
+        functions = self.function_rows(stats)
+        lines = [
+            "# pasta profile report",
+            f"script: {self.script}",
+            f"command: {' '.join(argv)}",
+            f"python: {platform.python_version()} ({platform.machine()})",
+            f"started: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - self.wall))}",
+            f"wall: {self.wall:.3f}s",
+            f"cpu: {self.cpu:.3f}s",
+            "",
+            "## Threads",
+            f"{'cpu s':>10} {'wall s':>10} {'threads':>8}  group",
+        ]
+        for group, (count, cpu, wall) in sorted(self.thread_rows().items(), key=lambda item: -item[1][1]):
+            lines.append(f"{cpu:10.3f} {wall:10.3f} {count:8d}  {group}")
+        running = [record.name for record in self.records if not record.wall]
+        if running:
+            lines.append(f"still running, not profiled: {', '.join(sorted(set(map(thread_group, running))))}")
+
+        for title, column in (("cumulative", 2), ("own", 1)):
+            lines += ["", f"## Functions by {title} time (top {TOP_FUNCTIONS})",
+                      f"{'cumtime':>10} {'tottime':>10} {'calls':>10}  function"]
+            top = sorted(functions.items(), key=lambda item: (-item[1][column], item[0]))[:TOP_FUNCTIONS]
+            for key, (calls, tottime, cumtime) in top:
+                lines.append(f"{cumtime:10.3f} {tottime:10.3f} {calls:10d}  {key}")
+
+        lines += ["", "## Memory", f"peak traced: {self.true_peak / 1024 / 1024:.1f} MB",
+                  f"peak sampled: {self.peak_memory / 1024 / 1024:.1f} MB at {self.peak_at:.1f}s"]
+        if self.peak_snapshot:
+            snapshot = self.peak_snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            ])
+            lines += ["", f"## Allocations at peak (top {TOP_ALLOCATIONS})", f"{'KB':>10} {'blocks':>10}  site"]
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                lines.append(f"{stat.size / 1024:10.0f} {stat.count:10d}  {short_path(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Add the shared --cprofile options to a script's parser"""
+    parser.add_argument('--cprofile', action='store_true',
+                        help='Profile the run (cProfile, per-thread CPU, tracemalloc peak) and write a report')
+    parser.add_argument('--cprofile-output', metavar='FILE',
+                        help='Report path (default: pasta-profile-<script>-<time>.txt); raw stats go to FILE.pstats')
+
+@contextmanager
+def profiling(args: argparse.Namespace, script: str):
+    """Profile the enclosed block when --cprofile was given; the report is written even on exit/errors"""
+    if not getattr(args, 'cprofile', False):
+        yield
+        return
+
+    output = args.cprofile_output or f"pasta-profile-{script}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+    profiler = Profiler(script)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        with open(output, 'w') as f:
+            f.write(profiler.report([os.path.basename(sys.argv[0])] + sys.argv[1:]))
+        profiler.stats().dump_stats(output + ".pstats")
+        # stderr, so `--silent` output stays just the URL
+        print(f"Profile written to {output}", file=sys.stderr)
+
+def parse_report(path: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Read back ({thread group: cpu}, {function: cumtime}) from a report"""
+    threads, functions, section = {}, {}, None
+    with open(path) as f:
+        for line in f:
+            if line.startswith("## "):
+                section = line[3:].split(" (")[0].strip()
+                continue
+            fields = line.split(None, 3)
+            if len(fields) < 4 or not re.match(r"^-?\d", fields[0]):
+                continue
+            if section == "Threads":
+                threads[fields[3].strip()] = float(fields[0])
+            elif section == "Functions by cumulative time":
+                functions[fields[3].strip()] = float(fields[0])
+    return threads, functions
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two pasta profile reports')
+    parser.add_argument('old', help='Report from the baseline run')
+    parser.add_argument('new', help='Report from the run to compare')
+    parser.add_argument('-n', '--top', type=int, default=15, help='Functions to show (default: 15)')
+    args = parser.parse_args()
+
+    for path in (args.old, args.new):
+        if not os.path.exists(path):
+            print(f"Error: report '{path}' not found")
+            sys.exit(1)
+    old_threads, old_functions = parse_report(args.old)
+    new_threads, new_functions = parse_report(args.new)
+
+    print(f"{'old cpu':>10} {'new cpu':>10} {'change':>10}  thread group")
+    for group in sorted(set(old_threads) | set(new_threads)):
+        old, new = old_threads.get(group, 0.0), new_threads.get(group, 0.0)
+        print(f"{old:10.3f} {new:10.3f} {new - old:+10.3f}  {group}")
+
+    print(f"\n{'old cum':>10} {'new cum':>10} {'change':>10}  function (largest changes)")
+    # Functions missing from one top list count as 0 there; a change into or out of the top is still a change
+    keys = set(old_functions) | set(new_functions)
+    changes = sorted(keys, key=lambda key: -abs(new_functions.get(key, 0.0) - old_functions.get(key, 0.0)))
+    for key in changes[:args.top]:
+        old, new = old_functions.get(key, 0.0), new_functions.get(key, 0.0)
+        print(f"{old:10.3f} {new:10.3f} {new - old:+10.3f}  {key}")
+
+if __name__ == "__main__":
+    main()
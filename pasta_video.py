@@ -9,7 +9,6 @@ Usage:
    ./pasta_video -p password vid.mp4    # Password protected video
 """
 
-import os
 import sys
 import json
 import requests
@@ -27,39 +26,11 @@ except ImportError:
     print("  pip install --break-system-packages rich")
     sys.exit(1)
 
-try:
-    from dotenv import load_dotenv
-except ImportError:
-    print("Error: python-dotenv not found. Please install with:")
-    print("  sudo pacman -S python-dotenv  # OR") 
-    print("  pip install --break-system-packages python-dotenv")
-    sys.exit(1)
-
-try:
-    from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
-except ImportError:
-    print("Error: requests-toolbelt not found. Please install with:")
-    print("  sudo pacman -S python-requests-toolbelt  # OR")
-    print("  pip install --break-system-packages requests-toolbelt")
-    sys.exit(1)
-
-def load_config():
-    """Load configuration from .env file"""
-    env_path = Path("/etc/pastit/.env")
-    if not env_path.exists():
-        print(".env file not found! Edit /etc/pastit/.env.example and rename it to /etc/pastit/.env to configure.")
-        sys.exit(1)
-    
-    load_dotenv(env_path)
-    
-    host = os.getenv("host")
-    auth_token = os.getenv("authorization_token")
-    
-    if not host or not auth_token:
-        print("Error: host or authorization_token not found in .env file")
-        sys.exit(1)
-    
-    return host, auth_token
+from pasta_config import add_config_arguments, config_from_args, load_config
+from pasta_hosts import HostPool, NoHealthyHostError
+from pasta_history import record_upload
+from pasta_multipart import MultipartBody
+from pasta_profile import add_profile_arguments, profiling
 
 def format_size(size_bytes):
     """Format file size in human readable format"""
@@ -72,15 +43,18 @@ def format_size(size_bytes):
     else:
         return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
 
-def upload_video(file_path, password=None, description=None, folder=None):
+def upload_video(file_path, password=None, description=None, folder=None, config=None):
     """Upload video with permanent hosting (no limits)"""
-    host, auth_token = load_config()
-    url = f"{host}/api/upload"
+    config = config or load_config()
+    pool = HostPool.from_config(config)
     
     file_path = Path(file_path)
     if not file_path.exists():
         print(f"Error: File '{file_path}' not found")
         sys.exit(1)
+    if not file_path.is_file():
+        print(f"Error: '{file_path}' is not a regular file; stream pipes with pasta_fast.py -")
+        sys.exit(1)
     
     # Check if it's a video file
     video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.mpg', '.mpeg', '.3gp'}
@@ -93,10 +67,8 @@ def upload_video(file_path, password=None, description=None, folder=None):
     
     file_size = file_path.stat().st_size
     
-    # Headers - NO view limits, NO expiration
+    # Headers - NO view limits, NO expiration (auth is added per host)
     headers = {
-        "Authorization": auth_token,
-        "x-zipline-format": "gfycat",
         "x-zipline-original-name": "true",
         # Explicitly NOT setting:
         # - x-zipline-max-views (no view limit)
@@ -151,23 +123,31 @@ def upload_video(file_path, password=None, description=None, folder=None):
     with progress:
         task = progress.add_task("upload", total=file_size)
         
-        def upload_callback(monitor):
-            progress.update(task, advance=monitor.bytes_read - progress.tasks[task].completed)
-        
-        with open(file_path, 'rb') as f:
+        def send(node_config):
+            # Restart the bar if a failed host already consumed part of the file
+            progress.reset(task, total=file_size)
+            
             # Determine MIME type for video
             mime_type = 'video/mp4' if file_path.suffix.lower() == '.mp4' else 'application/octet-stream'
             
-            encoder = MultipartEncoder(
-                fields={'file': (file_path.name, f, mime_type)}
-            )
-            monitor = MultipartEncoderMonitor(encoder, upload_callback)
-            
-            response = requests.post(
-                url,
-                data=monitor,
-                headers={**headers, 'Content-Type': monitor.content_type}
-            )
+            # A fresh body per attempt, so a retry restarts from byte 0
+            with MultipartBody(file_path, file_path.name, mime_type, buffers=config.read_buffers,
+                               buffer_size=config.read_buffer_size, rate_limit=config.rate_limit) as body:
+                body.callback = lambda nbytes: progress.update(task, advance=nbytes)
+                body.stall = pool.policy.stall_monitor()
+                
+                return requests.post(
+                    node_config.upload_url,
+                    data=body,
+                    headers={**node_config.upload_headers(), **headers, 'Content-Type': body.content_type},
+                    timeout=pool.policy.timeout
+                )
+        
+        try:
+            node, response = pool.upload(send)
+        except NoHealthyHostError as e:
+            console.print(f"[red]Error: Upload failed on every host: {e}[/red]")
+            sys.exit(1)
     
     console.print()
     
@@ -218,6 +198,10 @@ def upload_video(file_path, password=None, description=None, folder=None):
         console.print(f"[red]Error: Invalid response format: {e}[/red]")
         console.print(response.text)
         sys.exit(1)
+    
+    # The description is indexed as the searchable text of the upload
+    record_upload("pasta_video", node.config.host, file_info, path=file_path, size=file_size,
+                  folder=folder, content=description, config=config)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -236,6 +220,8 @@ Examples:
     parser.add_argument('-p', '--password', help='Password protect the video')
     parser.add_argument('-d', '--description', help='Description for the video')
     parser.add_argument('-f', '--folder', help='Folder to organize the video in')
+    add_config_arguments(parser)
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
@@ -243,7 +229,8 @@ Examples:
         parser.print_help()
         sys.exit(1)
     
-    upload_video(args.file, args.password, args.description, args.folder)
+    with profiling(args, "pasta_video"):
+        upload_video(args.file, args.password, args.description, args.folder, config_from_args(args))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -32,7 +32,7 @@ install_packages() {
             echo "📦 Detected Arch-based system"
             echo "Installing packages with pacman..."
             sudo pacman -S --needed --overwrite='/usr/lib/python*/site-packages/*' \
-                python-rich python-requests python-requests-toolbelt python-dotenv
+                python-rich python-requests python-dotenv
             ;;
         "ubuntu"|"debian"|"pop"|"mint")
             echo "📦 Detected Debian-based system"
@@ -40,7 +40,7 @@ install_packages() {
             sudo apt update
             sudo apt install -y python3-pip python3-venv
             # Install via pip since debian packages might be outdated
-            pip3 install --break-system-packages rich requests requests-toolbelt python-dotenv
+            pip3 install --break-system-packages rich requests python-dotenv
             ;;
         "fedora"|"centos"|"rhel"|"rocky"|"almalinux")
             echo "📦 Detected Red Hat-based system"
@@ -50,35 +50,50 @@ install_packages() {
             else
                 sudo yum install -y python3-pip
             fi
-            pip3 install --break-system-packages rich requests requests-toolbelt python-dotenv
+            pip3 install --break-system-packages rich requests python-dotenv
             ;;
         "opensuse"|"sles")
             echo "📦 Detected SUSE-based system"
             echo "Installing packages with zypper..."
             sudo zypper install -y python3-pip
-            pip3 install --break-system-packages rich requests requests-toolbelt python-dotenv
+            pip3 install --break-system-packages rich requests python-dotenv
             ;;
         *)
             echo "⚠️  Unknown distribution: $distro"
             echo "Attempting to install via pip..."
             if command -v pip3 >/dev/null 2>&1; then
-                pip3 install --break-system-packages rich requests requests-toolbelt python-dotenv
+                pip3 install --break-system-packages rich requests python-dotenv
             elif command -v pip >/dev/null 2>&1; then
-                pip install --break-system-packages rich requests requests-toolbelt python-dotenv
+                pip install --break-system-packages rich requests python-dotenv
             else
                 echo "❌ pip not found. Please install Python packages manually:"
-                echo "   pip install rich requests requests-toolbelt python-dotenv"
+                echo "   pip install rich requests python-dotenv"
                 exit 1
             fi
             ;;
     esac
 }
 
+# Optional extras: cryptography for encrypted uploads (-e), Pillow for image optimization (-O)
+install_optional_packages() {
+    local distro=$1
+    
+    echo "📦 Installing optional packages (encryption, image optimization)..."
+    case $distro in
+        "arch"|"manjaro"|"endeavouros")
+            sudo pacman -S --needed python-cryptography python-pillow
+            ;;
+        *)
+            python3 -m pip install --break-system-packages cryptography pillow
+            ;;
+    esac
+}
+
 # Function to verify installation
 verify_installation() {
     echo "🔍 Verifying installation..."
     
-    if python3 -c "import rich, requests, requests_toolbelt, dotenv" 2>/dev/null; then
+    if python3 -c "import rich, requests, dotenv" 2>/dev/null; then
         echo "✅ All dependencies installed successfully!"
         return 0
     else
@@ -95,7 +110,7 @@ fallback_install() {
     for pip_cmd in "pip3" "pip" "python3 -m pip" "python -m pip"; do
         if command -v $pip_cmd >/dev/null 2>&1; then
             echo "Trying $pip_cmd..."
-            $pip_cmd install --break-system-packages rich requests requests-toolbelt python-dotenv
+            $pip_cmd install --break-system-packages rich requests python-dotenv
             if verify_installation; then
                 return 0
             fi
@@ -103,7 +118,7 @@ fallback_install() {
     done
     
     echo "❌ Failed to install dependencies. Please install manually:"
-    echo "   pip install --break-system-packages rich requests requests-toolbelt python-dotenv"
+    echo "   pip install --break-system-packages rich requests python-dotenv"
     exit 1
 }
 
@@ -122,6 +137,12 @@ main() {
         fallback_install
     fi
     
+    # pasta works without these; only -e and -O need them
+    if ! install_optional_packages "$DISTRO"; then
+        echo "⚠️  Optional packages not installed. For encryption and image optimization run:"
+        echo "   pip install --break-system-packages cryptography pillow"
+    fi
+    
     # Make pasta executable
     if [ -f "pasta.py" ]; then
         chmod +x pasta.py